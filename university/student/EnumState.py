@@ -6,4 +6,6 @@ class StateModelEnum(Enum):
     CONNECTION_INVITATION = "CONNECTION INVITATION"
     OFFER_SENT = "OFFER SENT"
     CREDENTIAL_ISSUED = "CREDENTIAL ISSUED"
+    EXPIRED = "EXPIRED"
+    REVOKED = "REVOKED"
     # Add other states as needed
@@ -1,3 +1,101 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .EnumState import StateModelEnum
+from .models import ConnectionState, Student, VerifiedPresentation
+from .services import expire_flows, revoke_credentials, send_credential_offers
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an unbounded COUNT(*)
+
+    Unfiltered lists use the highest primary key as the row count; filtered
+    lists count at most COUNT_LIMIT rows.
+    """
+
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(max_pk=Max("pk"))["max_pk"] or 0
+        return queryset.order_by().values("pk")[: self.COUNT_LIMIT].count()
+
+
+class StateListFilter(admin.SimpleListFilter):
+    """Filter on the known flow states without a SELECT DISTINCT over the table"""
+
+    title = "state"
+    parameter_name = "state"
+
+    def lookups(self, request, model_admin):
+        return [(state.value, state.value) for state in StateModelEnum]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(state=self.value())
+        return queryset
+
+
+@admin.register(ConnectionState)
+class ConnectionStateAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "user",
+        "state",
+        "connection_state",
+        "connection_id",
+        "tenant_id",
+        "created_at",
+        "updated_at",
+    )
+    list_select_related = ("user",)
+    # Exact matches only, so that every search is an index lookup
+    search_fields = ("=connection_id", "=presentation_exchange_id")
+    list_filter = (StateListFilter, ("created_at", admin.DateFieldListFilter))
+    raw_id_fields = ("user",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ("resend_offer", "expire", "revoke")
+
+    @admin.action(description="Re-send credential offer (active connections)")
+    def resend_offer(self, request, queryset):
+        sent, failed = send_credential_offers(queryset)
+        self.message_user(request, f"{sent} offers sent, {failed} failed.")
+
+    @admin.action(description="Expire unfinished flows")
+    def expire(self, request, queryset):
+        expired = expire_flows(queryset)
+        self.message_user(request, f"{expired} flows expired.")
+
+    @admin.action(description="Revoke issued credentials")
+    def revoke(self, request, queryset):
+        revoked, failed = revoke_credentials(queryset)
+        self.message_user(request, f"{revoked} credentials revoked, {failed} failed.")
+
+
+@admin.register(Student)
+class StudentAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "department", "course")
+    list_select_related = ("user",)
+    search_fields = ("=user__username",)
+    raw_id_fields = ("user",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(VerifiedPresentation)
+class VerifiedPresentationAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "proof_template", "cred_def_id", "verified_at")
+    list_select_related = ("user",)
+    search_fields = ("=presentation_exchange_id",)
+    raw_id_fields = ("user",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,220 @@
+"""
+Append-only log of incoming webhook events.
+
+Events are written as JSON lines by a background thread, so recording an
+event only costs a queue put on the request path. Each process writes its
+own file (the pid is added to WEBHOOK_EVENT_LOG's name), so workers never
+rotate a file another worker is writing to. The logs rotate by size and
+rotated files are gzip-compressed. ``manage.py replay_events`` reads them
+back through the webhook handlers.
+"""
+
+import atexit
+import gzip
+import heapq
+import json
+import logging
+import mmap
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_event_logger = None
+_listener = None
+# (pid, WEBHOOK_EVENT_LOG) the event logger was created for
+_owner = None
+_lock = threading.Lock()
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def get_process_log_path(path, pid=None):
+    """
+    Return the event log file of a process
+
+    Args:
+        path: WEBHOOK_EVENT_LOG (e.g. logs/webhook-events.log)
+        pid: Process ID (default: the current process)
+
+    Returns:
+        str: Path with the pid before the extension (logs/webhook-events.1234.log)
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+def _stop_event_logger():
+    global _event_logger, _listener, _owner
+
+    if _listener is not None:
+        # A listener inherited from the parent process has no running thread
+        if _owner[0] == os.getpid():
+            _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    if _event_logger is not None:
+        for handler in list(_event_logger.handlers):
+            _event_logger.removeHandler(handler)
+    _event_logger = _listener = _owner = None
+
+
+@atexit.register
+def _flush_at_exit():
+    """Write the queued events before the interpreter exits"""
+    with _lock:
+        if _owner is not None and _owner[0] == os.getpid():
+            _stop_event_logger()
+
+
+def _get_event_logger():
+    """Create the event logger and its writer thread on first use in a process"""
+    global _event_logger, _listener, _owner
+
+    path = getattr(settings, "WEBHOOK_EVENT_LOG", "")
+    with _lock:
+        # Forked workers and overridden settings get a logger of their own
+        if _owner is not None and _owner != (os.getpid(), path):
+            _stop_event_logger()
+
+        if _event_logger is None:
+            if not path:
+                return None
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+            file_handler = RotatingFileHandler(
+                get_process_log_path(path),
+                maxBytes=getattr(settings, "WEBHOOK_EVENT_LOG_MAX_BYTES", 50 * 1024 * 1024),
+                backupCount=getattr(settings, "WEBHOOK_EVENT_LOG_BACKUP_COUNT", 20),
+                encoding="utf-8",
+                delay=True,
+            )
+            file_handler.namer = _gzip_namer
+            file_handler.rotator = _gzip_rotator
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+            event_queue = queue.SimpleQueue()
+            _listener = QueueListener(event_queue, file_handler)
+            _listener.start()
+
+            event_logger = logging.getLogger("student.webhook_events")
+            event_logger.setLevel(logging.INFO)
+            event_logger.propagate = False
+            event_logger.addHandler(QueueHandler(event_queue))
+            _event_logger = event_logger
+            _owner = (os.getpid(), path)
+
+    return _event_logger
+
+
+def record_event(topic, body, wallet_id=None):
+    """
+    Append a webhook event to the event log
+
+    Args:
+        topic: Webhook topic (connections, issue_credential, ...)
+        body: Decoded webhook payload
+        wallet_id: Traction tenant that sent the event (optional)
+    """
+    event_logger = _get_event_logger()
+    if event_logger is None:
+        return
+
+    event_logger.info(
+        json.dumps(
+            {"ts": time.time(), "topic": topic, "wallet_id": wallet_id, "body": body},
+            separators=(",", ":"),
+        )
+    )
+
+
+def get_log_files(path):
+    """
+    Return the event logs of every process and their rotated files
+
+    Each process's files are listed oldest first; iter_events merges the
+    processes back into one timeline.
+
+    Args:
+        path: WEBHOOK_EVENT_LOG
+
+    Returns:
+        list: File paths
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    root, ext = os.path.splitext(name)
+    # name.<pid>.ext and its rotated files; name.ext itself predates per-process logs
+    pattern = re.compile(
+        rf"^{re.escape(root)}(?:\.(\d+))?{re.escape(ext)}(?:\.(\d+)\.gz)?$"
+    )
+
+    files = []
+    for entry in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = pattern.match(entry)
+        if match:
+            pid, rotation = match.groups()
+            # Rotated files first, the highest number being the oldest
+            order = (int(pid or -1), -int(rotation) if rotation else 0)
+            files.append((order, os.path.join(directory, entry)))
+
+    return [file for _, file in sorted(files)]
+
+
+def _iter_lines(path):
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            yield from f
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from iter(mapped.readline, b"")
+
+
+def _iter_file_events(path):
+    for line in _iter_lines(path):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # A torn last line after a crash must not stop the replay
+            logger.warning(f"Skipping malformed event in {path}")
+
+
+def iter_events(paths):
+    """
+    Stream events from event log files without loading them in memory
+
+    Every file is in chronological order, so the files are read side by side
+    and their events merged by timestamp: the logs of concurrent processes
+    replay as one timeline.
+
+    Args:
+        paths: Event log files
+
+    Yields:
+        dict: Logged events (ts, topic, wallet_id, body)
+    """
+    yield from heapq.merge(
+        *(_iter_file_events(path) for path in paths),
+        key=lambda event: event.get("ts") or 0,
+    )
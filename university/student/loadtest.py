@@ -0,0 +1,144 @@
+"""
+Tooling shared by the soak test and the benchmarks.
+
+``local_environment()`` isolates a run (throwaway test database, in-process
+Traction stub, temporary event log) and ``WSGIClient`` drives the deployed
+WSGI application the way a server would. Unlike django.test.Client it keeps
+no per-request state, so it does not skew memory or query measurements.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import override_settings
+
+from .traction_django import TractionDjangoClient
+from .traction_stub import get_stub_url, start_traction_stub
+from .webhooks import WebhookDispatcher
+
+LOCAL_TENANT = "local"
+# Unmasked CSRF secret sent both as cookie and header
+CSRF_TOKEN = "local" * 6 + "ab"
+
+
+@contextmanager
+def local_environment(latency=0.0, **overrides):
+    """
+    Run against a throwaway database and a local Traction stub
+
+    Args:
+        latency: Artificial latency in seconds added to every stub response
+        **overrides: Extra settings to override for the duration of the run
+    """
+    server = start_traction_stub(latency=latency)
+    # Flows are written to a throwaway test database, never the real one
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    try:
+        with tempfile.TemporaryDirectory() as log_dir, override_settings(
+            DEBUG=False,
+            TRACTION_API_BASE_URL=get_stub_url(server),
+            TRACTION_TENANT_ID=LOCAL_TENANT,
+            TRACTION_API_KEY=LOCAL_TENANT,
+            TRACTION_CREDENTIAL_DEFINITION_ID="local:3:CL:1:student",
+            TRACTION_TENANTS={},
+            TRACTION_RATE_LIMITS={},
+            WEBHOOK_API_KEY=LOCAL_TENANT,
+            WEBHOOK_HMAC_SECRET="",
+            WEBHOOK_EVENT_LOG=os.path.join(log_dir, "webhook-events.log"),
+            **overrides,
+        ):
+            TractionDjangoClient.reset_client()
+            yield
+    finally:
+        TractionDjangoClient.reset_client()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        server.shutdown()
+
+
+class WSGIClient:
+    """Minimal client calling the webhook dispatcher + Django WSGI application"""
+
+    def __init__(self):
+        # Built here, not imported from wsgi.py, so middleware picks up the
+        # settings in effect (e.g. an overridden SESSION_ENGINE)
+        self.application = WebhookDispatcher(WSGIHandler())
+        self.cookie = f"{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}"
+        self.requests = self.errors = 0
+
+    def login(self, user):
+        """Open a session for a user in the configured session engine"""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        self.cookie = (
+            f"{settings.SESSION_COOKIE_NAME}={session.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}"
+        )
+
+    def _start_response(self, status, headers, exc_info=None):
+        self.status = int(status.split(" ", 1)[0])
+        if self.status >= 400:
+            self.errors += 1
+
+    def request(self, method, path, body=b"", content_type="application/json", **headers):
+        """
+        Send one request through the WSGI application
+
+        Returns:
+            bytes: Response content
+        """
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_TYPE": content_type,
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.url_scheme": "http",
+            **headers,
+        }
+        response = self.application(environ, self._start_response)
+        try:
+            content = b"".join(response)
+        finally:
+            response.close()
+        self.requests += 1
+        return content
+
+    def page(self, method, path, data=None):
+        """Request a page as the logged-in user (form-encoded, CSRF token included)"""
+        return self.request(
+            method,
+            path,
+            urlencode(data or {}).encode(),
+            content_type="application/x-www-form-urlencoded",
+            HTTP_COOKIE=self.cookie,
+            HTTP_X_CSRFTOKEN=CSRF_TOKEN,
+        )
+
+    def webhook(self, path, body):
+        """Send a Traction webhook"""
+        return self.request(
+            "POST",
+            path,
+            json.dumps(body).encode(),
+            HTTP_X_API_KEY=settings.WEBHOOK_API_KEY,
+        )
@@ -0,0 +1,88 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from student.loadtest import WSGIClient, local_environment
+from student.models import ConnectionState
+
+FLOW_TOKEN_RE = re.compile(rb'flow(?:_token" value="|=)([\w:.%-]+)')
+
+
+class Command(BaseCommand):
+    help = "Count database queries per request along a complete student flow"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--session-engine",
+            action="append",
+            help="Session engine to measure (repeatable; default: SESSION_ENGINE)",
+        )
+        parser.add_argument("--flows", type=int, default=10, help="Flows averaged per engine")
+
+    def handle(self, *args, **options):
+        engines = options["session_engine"] or [settings.SESSION_ENGINE]
+        for run, engine in enumerate(engines):
+            with local_environment(SESSION_ENGINE=engine):
+                self.client = WSGIClient()
+                self.queries = defaultdict(list)
+                for flow in range(options["flows"]):
+                    self.run_flow(f"bench-{run}-{flow}")
+
+            self.stdout.write(f"\n{engine}")
+            self.stdout.write(f"  {'request':<40}{'queries':>8}{'session':>9}")
+            for step, counts in self.queries.items():
+                total = sum(count for count, _ in counts) / len(counts)
+                session = sum(count for _, count in counts) / len(counts)
+                self.stdout.write(f"  {step:<40}{total:>8.1f}{session:>9.1f}")
+            if self.client.errors:
+                self.stderr.write(f"  {self.client.errors} requests failed")
+
+    def measure(self, step, send, *args):
+        with CaptureQueriesContext(connection) as captured:
+            content = send(*args)
+        session = sum("django_session" in query["sql"] for query in captured)
+        self.queries[step].append((len(captured), session))
+        return content
+
+    def run_flow(self, username):
+        user = User.objects.create(username=username)
+        self.client.login(user)
+        page, webhook = self.client.page, self.client.webhook
+
+        self.measure("GET home", page, "GET", reverse("student:home"))
+        self.measure("GET credential (new invitation)", page, "GET", reverse("student:issue-badge"))
+        connection_id = (
+            ConnectionState.objects.filter(user=user)
+            .values_list("connection_id", flat=True)
+            .first()
+        )
+        self.measure(
+            "webhook connections (active)",
+            webhook,
+            reverse("student:webhook_connections"),
+            {"connection_id": connection_id, "state": "active"},
+        )
+        content = self.measure(
+            "GET credential (offer sent)", page, "GET", reverse("student:issue-badge")
+        )
+        match = FLOW_TOKEN_RE.search(content)
+        flow_token = match.group(1).decode() if match else ""
+        self.measure(
+            "GET presentation request",
+            page,
+            "GET",
+            reverse("student:presentation-request"),
+        )
+        self.measure(
+            "POST presentation request",
+            page,
+            "POST",
+            reverse("student:presentation-request"),
+            {"flow_token": flow_token} if flow_token else None,
+        )
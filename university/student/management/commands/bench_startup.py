@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: boot Django and serve one request
+FIRST_REQUEST_SCRIPT = """
+import io, json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", {settings_module!r})
+from university.wsgi import application
+body = b"{{}}"
+environ = {{
+    "REQUEST_METHOD": {method!r},
+    "PATH_INFO": {path!r},
+    "SERVER_NAME": "localhost",
+    "SERVER_PORT": "80",
+    "CONTENT_TYPE": "application/json",
+    "CONTENT_LENGTH": str(len(body)),
+    "HTTP_X_API_KEY": {api_key!r},
+    "wsgi.input": io.BytesIO(body),
+    "wsgi.errors": sys.stderr,
+    "wsgi.url_scheme": "http",
+}}
+statuses = []
+application(environ, lambda status, headers: statuses.append(status)).close()
+print(json.dumps({{"seconds": time.perf_counter() - start, "status": statuses[0],
+                  "modules": sorted(sys.modules)}}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Dependencies that should only be loaded when a view needs them
+HEAVY_MODULES = ("requests", "qrcode", "PIL")
+
+
+class Command(BaseCommand):
+    help = "Measure interpreter start-up imports and time to first request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/topic/ping/")
+        parser.add_argument("--method", default="POST")
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--top", type=int, default=15)
+
+    def _run_once(self, options, log_dir):
+        script = FIRST_REQUEST_SCRIPT.format(
+            settings_module=os.environ["DJANGO_SETTINGS_MODULE"],
+            method=options["method"],
+            path=options["path"],
+            api_key=settings.WEBHOOK_API_KEY or "bench",
+        )
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "WEBHOOK_API_KEY": settings.WEBHOOK_API_KEY or "bench",
+                # The pings go to a throwaway event log, never the real one
+                "WEBHOOK_EVENT_LOG": os.path.join(log_dir, "webhook-events.log"),
+            },
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        imports = {}
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+        return json.loads(result.stdout.strip().splitlines()[-1]), imports
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as log_dir:
+            runs = [self._run_once(options, log_dir) for _ in range(options["runs"])]
+        first_request = [report["seconds"] for report, _ in runs]
+        report, imports = runs[-1]
+
+        total_us = sum(self_us for self_us, _, _ in imports.values())
+        self.stdout.write(
+            f"{options['method']} {options['path']} -> {report['status']}, "
+            f"{options['runs']} runs"
+        )
+        self.stdout.write(
+            f"time to first request: median {statistics.median(first_request) * 1000:.1f} ms, "
+            f"min {min(first_request) * 1000:.1f} ms"
+        )
+        self.stdout.write(f"modules imported: {len(imports)}, import time {total_us / 1000:.1f} ms")
+
+        loaded = [name for name in HEAVY_MODULES if name in report["modules"]]
+        self.stdout.write(f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+        if not options["top"]:
+            return
+        self.stdout.write(f"top {options['top']} imports by cumulative time:")
+        top = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (self_us, cumulative_us, _) in top[: options["top"]]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:8.1f} ms  {name}")
@@ -0,0 +1,68 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from student.webhooks import WebhookWSGIHandler
+
+
+def _start_response(status, headers):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure webhook requests per second through the full and the lean WSGI stack"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--path", default="/topic/ping/")
+
+    def _environ(self, path, body):
+        return {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_X_API_KEY": settings.WEBHOOK_API_KEY,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.url_scheme": "http",
+        }
+
+    def _run(self, application, path, body, count):
+        for _ in range(min(count, 100)):
+            application(self._environ(path, body), _start_response).close()
+
+        start = time.perf_counter()
+        for _ in range(count):
+            application(self._environ(path, body), _start_response).close()
+        return count / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        body = json.dumps({"comment": "bench"}).encode()
+        count = options["requests"]
+
+        # Measure accepted requests even when no webhook key is configured; the
+        # pings go to a throwaway event log, never the real one
+        with tempfile.TemporaryDirectory() as log_dir, override_settings(
+            WEBHOOK_API_KEY=settings.WEBHOOK_API_KEY or "bench",
+            WEBHOOK_EVENT_LOG=os.path.join(log_dir, "webhook-events.log"),
+        ):
+            full = self._run(WSGIHandler(), options["path"], body, count)
+            lean = self._run(WebhookWSGIHandler(), options["path"], body, count)
+
+        self.stdout.write(f"full middleware stack: {full:10.1f} req/s")
+        self.stdout.write(f"lean webhook handler:  {lean:10.1f} req/s")
+        self.stdout.write(f"speedup:               {lean / full:10.2f}x")
@@ -0,0 +1,87 @@
+import datetime
+import math
+
+from django.core.management.base import BaseCommand
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from student.models import ConnectionState
+
+# (stage, start timestamp, end timestamp)
+STAGES = [
+    ("invitation -> connected", "created_at", "connected_at"),
+    ("connected -> offer sent", "connected_at", "offer_sent_at"),
+    ("offer sent -> issued", "offer_sent_at", "issued_at"),
+    ("invitation -> issued", "created_at", "issued_at"),
+    ("proof requested -> verified", "proof_requested_at", "verified_at"),
+]
+PERCENTILES = (50, 90, 99)
+
+
+def stage_stats(queryset, start, end):
+    """
+    Count and percentiles of the time between two stage timestamps
+
+    Each percentile is a single ORDER BY ... LIMIT 1 OFFSET k query, so the
+    rows never reach Python. Flows whose end timestamp precedes the start (a
+    stage timestamp left from an earlier attempt) are skipped.
+
+    Returns:
+        tuple: (count, {percentile: timedelta})
+    """
+    durations = (
+        queryset.filter(**{f"{start}__isnull": False, f"{end}__gte": F(start)})
+        .annotate(duration=ExpressionWrapper(F(end) - F(start), output_field=DurationField()))
+        .order_by("duration")
+        .values_list("duration", flat=True)
+    )
+    count = durations.count()
+    if not count:
+        return 0, {}
+    # Nearest-rank percentile
+    return count, {
+        p: durations[max(0, math.ceil(p / 100 * count) - 1)] for p in PERCENTILES
+    }
+
+
+def _format_duration(duration):
+    seconds = duration.total_seconds()
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+class Command(BaseCommand):
+    help = "Report how long flows spend in each issuance and verification stage"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Only include flows created in the last HOURS hours",
+        )
+        parser.add_argument("--tenant", default=None, help="Only include this tenant")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - datetime.timedelta(hours=options["hours"])
+        # Served by the created_at index
+        queryset = ConnectionState.objects.filter(created_at__gte=since)
+        if options["tenant"] is not None:
+            queryset = queryset.filter(tenant_id=options["tenant"])
+
+        self.stdout.write(
+            f"{'stage':<30}{'count':>8}"
+            + "".join(f"{f'p{p}':>10}" for p in PERCENTILES)
+        )
+        for stage, start, end in STAGES:
+            count, percentiles = stage_stats(queryset, start, end)
+            self.stdout.write(
+                f"{stage:<30}{count:>8}"
+                + "".join(
+                    f"{_format_duration(percentiles[p]) if count else '-':>10}"
+                    for p in PERCENTILES
+                )
+            )
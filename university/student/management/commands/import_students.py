@@ -0,0 +1,230 @@
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from student.EnumState import StateModelEnum
+from student.models import ConnectionState, Student
+from student.services import snapshot_credential_attributes
+from student.traction_django import get_tenant_for_department, get_traction_client
+
+REQUIRED_COLUMNS = {"username", "password"}
+
+
+def _init_worker():
+    # Hashers read the Django settings, which spawned workers have not loaded yet
+    import django
+
+    django.setup()
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = "Import students (User and Student rows) from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "csv_path",
+            help="CSV with username, password and optional first_name, last_name, "
+            "email, department, course columns",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes hashing passwords",
+        )
+        parser.add_argument(
+            "--create-invitations",
+            metavar="OUTPUT_CSV",
+            help="Also create a Traction invitation per imported student and "
+            "write username,invitation_url to this file",
+        )
+
+    def handle(self, *args, **options):
+        self.imported = self.skipped = self.invalid = 0
+        # Usernames of this run: a repeat may still be waiting in the pending chunk
+        self.seen = set()
+        start = time.perf_counter()
+
+        with open(
+            options["csv_path"], newline="", encoding="utf-8"
+        ) as csv_file, self.invitation_output(options["create_invitations"]):
+            reader = csv.DictReader(csv_file)
+            missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+
+            with ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=_init_worker
+            ) as executor:
+                # Hash the next chunk in the pool while the current one is inserted
+                pending = None
+                for chunk in _chunks(reader, options["chunk_size"]):
+                    chunk = self.new_rows(chunk)
+                    hashes = executor.map(
+                        make_password,
+                        [row["password"] for row in chunk],
+                        chunksize=max(1, len(chunk) // (options["workers"] * 4)),
+                    )
+                    if pending:
+                        self.insert_chunk(*pending, options)
+                    pending = (chunk, hashes)
+                if pending:
+                    self.insert_chunk(*pending, options)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{self.imported} students imported, {self.skipped} skipped, "
+            f"{self.invalid} invalid in "
+            f"{elapsed:.1f}s ({self.imported / elapsed if elapsed else 0:.1f} rows/s)"
+        )
+
+        if options["create_invitations"]:
+            self.stdout.write(
+                f"{self.invitations_created} invitations created, "
+                f"{self.invitations_failed} failed; "
+                f"URLs written to {options['create_invitations']}"
+            )
+
+    def new_rows(self, chunk):
+        """
+        Drop invalid rows and rows whose username exists or repeats, before paying for their hash
+
+        The previous chunk is only inserted after this one is filtered, so
+        repeats are checked against the usernames seen in this run as well as
+        against the database.
+        """
+        valid = []
+        for row in chunk:
+            row["username"] = (row["username"] or "").strip()
+            if not row["username"] or not row["password"]:
+                self.invalid += 1
+                continue
+            valid.append(row)
+
+        existing = set(
+            User.objects.filter(username__in=[row["username"] for row in valid])
+            .values_list("username", flat=True)
+        )
+        rows = []
+        for row in valid:
+            if row["username"] in existing or row["username"] in self.seen:
+                self.skipped += 1
+                continue
+            self.seen.add(row["username"])
+            rows.append(row)
+        return rows
+
+    def insert_chunk(self, chunk, hashes, options):
+        users = []
+        students = {}
+        for row, password in zip(chunk, hashes):
+            username = row["username"]
+            users.append(
+                User(
+                    username=username,
+                    password=password,
+                    first_name=row.get("first_name") or "",
+                    last_name=row.get("last_name") or "",
+                    email=row.get("email") or "",
+                )
+            )
+            students[username] = Student(
+                department=row.get("department") or "",
+                course=row.get("course") or "",
+            )
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backends that cannot return primary keys from bulk inserts
+                users = list(User.objects.filter(username__in=list(students)))
+            for user in users:
+                students[user.username].user = user
+            Student.objects.bulk_create(students.values())
+
+        self.imported += len(users)
+        if options["create_invitations"]:
+            self.write_invitations([(user, students[user.username]) for user in users])
+
+    @contextmanager
+    def invitation_output(self, output_path):
+        """Open the invitations CSV and the threads creating invitations, if requested"""
+        self.invitations_created = self.invitations_failed = 0
+        if not output_path:
+            yield
+            return
+
+        with open(output_path, "w", newline="", encoding="utf-8") as output, ThreadPoolExecutor(
+            max_workers=8
+        ) as executor:
+            self.invitation_writer = csv.writer(output)
+            self.invitation_writer.writerow(["username", "invitation_url"])
+            self.invitation_executor = executor
+            yield
+
+    def write_invitations(self, students):
+        """
+        Create the invitations of an inserted chunk and write their URLs
+
+        Invitations are created per chunk, so only one chunk of students is
+        held at a time. The tenants are resolved from the departments here;
+        the threads only talk to Traction, never to the database.
+
+        Args:
+            students: (User, Student) pairs
+        """
+
+        def create_invitation(tenant_id):
+            return get_traction_client(tenant_id).send_traction_request(
+                endpoint="/connections/create-invitation"
+            )
+
+        for batch in _chunks(iter(students), 500):
+            tenants = [get_tenant_for_department(student.department) for _, student in batch]
+            futures = [
+                self.invitation_executor.submit(create_invitation, tenant_id)
+                for tenant_id in tenants
+            ]
+            state_models = []
+            for (user, student), tenant_id, future in zip(batch, tenants, futures):
+                try:
+                    data = future.result()
+                except Exception as err:
+                    self.invitations_failed += 1
+                    self.stderr.write(str(err))
+                    continue
+                if not data.get("connection_id"):
+                    self.invitations_failed += 1
+                    continue
+                state_models.append(
+                    ConnectionState(
+                        connection_id=data["connection_id"],
+                        revocation_registry_id="",
+                        revocation_id="",
+                        presentation_exchange_id="",
+                        state=StateModelEnum.CONNECTION_INVITATION.value,
+                        tenant_id=tenant_id,
+                        credential_attributes=snapshot_credential_attributes(user, student),
+                        user=user,
+                    )
+                )
+                self.invitation_writer.writerow([user.username, data.get("invitation_url", "")])
+            ConnectionState.objects.bulk_create(state_models)
+            self.invitations_created += len(state_models)
@@ -0,0 +1,130 @@
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from student.EnumState import StateModelEnum
+from student.models import ConnectionState, JobCursor
+from student.services import WEBHOOK_HANDLERS
+from student.traction_django import get_tenant_config, get_traction_client
+
+CURSOR_NAME = "reconcile"
+
+
+def get_wallet_id(state_model):
+    """Wallet ID the flow's tenant sends its webhooks with, as the handlers expect"""
+    return get_tenant_config(state_model.tenant_id or None)["wallet_id"]
+
+
+def fetch_events(state_model):
+    """
+    Fetch the Traction records of a stuck flow, shaped like webhook events
+
+    Runs in a worker thread, so it only talks to Traction, never to the database.
+
+    Returns:
+        list: (topic, record) pairs, oldest first
+    """
+    _client = get_traction_client(state_model.tenant_id or None)
+
+    if state_model.state == StateModelEnum.CONNECTION_INVITATION.value:
+        record = _client.send_traction_request(
+            f"/connections/{state_model.connection_id}", method="GET"
+        )
+        return [("connections", record)] if record.get("state") else []
+
+    if state_model.credential_exchange_id:
+        # A reused connection lists the exchanges of earlier offers too
+        record = _client.send_traction_request(
+            f"/issue-credential/records/{state_model.credential_exchange_id}", method="GET"
+        )
+        return [("issue_credential", record)] if record.get("state") else []
+
+    # Offers sent before exchange IDs were stored
+    records = sorted(
+        _client.iter_credential_records(connection_id=state_model.connection_id),
+        key=lambda record: record.get("updated_at") or "",
+    )
+    return [("issue_credential", record) for record in records if record.get("state")]
+
+
+class Command(BaseCommand):
+    help = "Apply missed webhook transitions to stale, unfinished flows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-rows", type=int, default=1000, help="Rows checked per run"
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Seconds without an update before a flow is considered stuck",
+        )
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep running every --interval seconds"
+        )
+        parser.add_argument("--interval", type=int, default=300)
+        parser.add_argument(
+            "--reset", action="store_true", help="Start again from the first row"
+        )
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            JobCursor.objects.filter(name=CURSOR_NAME).update(position=0)
+
+        while True:
+            self.reconcile(options)
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def reconcile(self, options):
+        cursor, _ = JobCursor.objects.get_or_create(name=CURSOR_NAME)
+        cutoff = timezone.now() - datetime.timedelta(seconds=options["stale_after"])
+        checked = applied = failed = 0
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while checked < options["max_rows"]:
+                limit = min(options["batch_size"], options["max_rows"] - checked)
+                # Served by the (state, updated_at) index
+                batch = list(
+                    ConnectionState.objects.filter(
+                        state__in=[
+                            StateModelEnum.CONNECTION_INVITATION.value,
+                            StateModelEnum.OFFER_SENT.value,
+                        ],
+                        updated_at__lt=cutoff,
+                        pk__gt=cursor.position,
+                    )
+                    .only("pk", "connection_id", "credential_exchange_id", "state", "tenant_id")
+                    .order_by("pk")[:limit]
+                )
+
+                futures = [executor.submit(fetch_events, row) for row in batch]
+                for state_model, future in zip(batch, futures):
+                    try:
+                        for topic, record in future.result():
+                            WEBHOOK_HANDLERS[topic](record, get_wallet_id(state_model))
+                            applied += 1
+                    except Exception as err:
+                        failed += 1
+                        self.stderr.write(f"{state_model.connection_id}: {err}")
+
+                checked += len(batch)
+                if len(batch) < limit:
+                    # Reached the end: the next run starts over from the first row
+                    cursor.position = 0
+                    break
+                cursor.position = batch[-1].pk
+                cursor.save(update_fields=["position", "updated_at"])
+
+        cursor.save(update_fields=["position", "updated_at"])
+        self.stdout.write(
+            f"{checked} stale flows checked, {applied} events applied, "
+            f"{failed} failed, cursor at {cursor.position}"
+        )
@@ -0,0 +1,112 @@
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from student.event_log import get_log_files, iter_events
+from student.services import WEBHOOK_HANDLERS
+from student.traction_django import TractionDjangoClient
+
+
+class Command(BaseCommand):
+    help = "Replay logged webhook events through the webhook handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Event log files (default: WEBHOOK_EVENT_LOG and its rotated files)",
+        )
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=0.0,
+            help="Replay speed relative to the recorded timing (0 = as fast as possible)",
+        )
+        parser.add_argument("--topic", action="append", help="Only replay these topics")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Read and count the events without applying them",
+        )
+        parser.add_argument(
+            "--traction-url",
+            help="Send Traction calls of every tenant to this URL, e.g. a running traction_stub",
+        )
+        parser.add_argument(
+            "--live",
+            action="store_true",
+            help="Apply the events against the configured Traction tenants",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or get_log_files(settings.WEBHOOK_EVENT_LOG)
+        if not paths:
+            raise CommandError("No event log files found")
+
+        # Handlers issue credentials and send requests: never hit the real tenants by accident
+        if not (options["dry_run"] or options["traction_url"] or options["live"]):
+            raise CommandError(
+                "Replaying sends requests to the configured Traction tenants; "
+                "use --dry-run, --traction-url or --live"
+            )
+
+        if options["traction_url"]:
+            url = options["traction_url"]
+            redirect = override_settings(
+                TRACTION_API_BASE_URL=url,
+                TRACTION_TENANTS={
+                    tenant_id: {**config, "base_url": url}
+                    for tenant_id, config in settings.TRACTION_TENANTS.items()
+                },
+            )
+        else:
+            redirect = nullcontext()
+
+        TractionDjangoClient.reset_client()
+        try:
+            with redirect:
+                self.replay(paths, options)
+        finally:
+            TractionDjangoClient.reset_client()
+
+    def replay(self, paths, options):
+        topics = set(options["topic"] or WEBHOOK_HANDLERS)
+        speed = options["speed"]
+        counts = Counter()
+        failures = 0
+        first_ts = None
+        start = time.perf_counter()
+
+        for event in iter_events(paths):
+            topic = event.get("topic")
+            if topic not in topics:
+                continue
+
+            if speed > 0:
+                first_ts = event["ts"] if first_ts is None else first_ts
+                delay = (event["ts"] - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            counts[topic] += 1
+            if options["dry_run"]:
+                continue
+
+            try:
+                WEBHOOK_HANDLERS[topic](event.get("body") or {}, event.get("wallet_id"))
+            except Exception as err:
+                failures += 1
+                self.stderr.write(f"{topic} event failed: {err}")
+
+        elapsed = time.perf_counter() - start
+        total = sum(counts.values())
+        for topic, count in sorted(counts.items()):
+            self.stdout.write(f"{topic:20} {count:10}")
+        self.stdout.write(
+            f"{total} events in {elapsed:.2f}s "
+            f"({total / elapsed if elapsed else 0:.1f} events/s), {failures} failed"
+        )
@@ -0,0 +1,188 @@
+import gc
+import resource
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from student.loadtest import WSGIClient, local_environment
+from student.models import ConnectionState
+
+# Allocations of the soak harness and the in-process stub are not the app's
+IGNORED_FILES = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "*/linecache.py",
+    "*/socketserver.py",
+    "*/http/server.py",
+    "*/student/traction_stub.py",
+    "*/student/loadtest.py",
+    __file__,
+)
+
+
+def _snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in IGNORED_FILES]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive complete issuance/verification flows against a local Traction stub "
+        "and fail if memory grows per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration", type=float, default=3600, help="Seconds to run (default: 1 hour)"
+        )
+        parser.add_argument(
+            "--max-flows", type=int, default=0, help="Stop after this many flows (0: no limit)"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=200, help="Flows run before the baseline snapshot"
+        )
+        parser.add_argument(
+            "--snapshot-interval", type=float, default=60, help="Seconds between snapshots"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=256,
+            help="Maximum traced memory growth per request, in bytes",
+        )
+        parser.add_argument("--top", type=int, default=10, help="Growth sites reported")
+        parser.add_argument("--frames", type=int, default=1, help="Traceback depth recorded")
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Stub latency per Traction call"
+        )
+
+    def handle(self, *args, **options):
+        with local_environment(latency=options["latency"]):
+            self.soak(options)
+
+    def soak(self, options):
+        # The deployed WSGI application, not the test client, which itself
+        # accumulates signal receivers per request
+        self.client = WSGIClient()
+        self.flows = 0
+
+        self.stdout.write(f"Warming up with {options['warmup']} flows...")
+        for _ in range(options["warmup"]):
+            self.run_flow()
+
+        tracemalloc.start(options["frames"])
+        baseline = _snapshot()
+        baseline_requests = self.client.requests
+        start = next_snapshot = time.monotonic()
+        growth_per_request = 0.0
+        stats = []
+
+        self.stdout.write(
+            f"{'elapsed':>8} {'flows':>8} {'requests':>9} {'traced':>10} "
+            f"{'growth/req':>11} {'max rss':>10} {'errors':>7}"
+        )
+        try:
+            while True:
+                self.run_flow()
+                now = time.monotonic()
+                done = now - start >= options["duration"] or (
+                    options["max_flows"] and self.flows >= options["max_flows"]
+                )
+                if now < next_snapshot and not done:
+                    continue
+
+                next_snapshot = now + options["snapshot_interval"]
+                stats = _snapshot().compare_to(baseline, "traceback")
+                requests = self.client.requests - baseline_requests
+                growth_per_request = sum(stat.size_diff for stat in stats) / max(requests, 1)
+                self.stdout.write(
+                    f"{now - start:>7.0f}s {self.flows:>8} {self.client.requests:>9} "
+                    f"{tracemalloc.get_traced_memory()[0] / 1024:>8.0f}KB "
+                    f"{growth_per_request:>10.1f}B "
+                    f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>8.0f}MB "
+                    f"{self.client.errors:>7}"
+                )
+                if done:
+                    break
+        finally:
+            tracemalloc.stop()
+
+        self.stdout.write(f"\nTop {options['top']} allocation growth sites:")
+        for stat in stats[: options["top"]]:
+            self.stdout.write(
+                f"  {stat.size_diff / 1024:+9.1f}KB {stat.count_diff:+7} blocks  "
+                + " <- ".join(str(frame) for frame in stat.traceback)
+            )
+
+        if self.client.errors:
+            raise CommandError(f"{self.client.errors} requests failed")
+        if growth_per_request > options["threshold"]:
+            raise CommandError(
+                f"Memory grew {growth_per_request:.1f} bytes per request "
+                f"(threshold {options['threshold']:.0f})"
+            )
+        self.stdout.write(
+            f"OK: {growth_per_request:.1f} bytes per request "
+            f"(threshold {options['threshold']:.0f})"
+        )
+
+    def _page(self, method, name):
+        self.client.page(method, reverse(f"student:{name}"))
+
+    def _webhook(self, name, body):
+        self.client.webhook(reverse(f"student:{name}"), body)
+
+    def run_flow(self):
+        """One student: invitation, connection, issuance, verification and a cached re-check"""
+        user = User.objects.create(username=f"soak-{self.flows}")
+        self.client.login(user)
+
+        self._page("GET", "issue-badge")
+        connection_id = (
+            ConnectionState.objects.filter(user=user)
+            .values_list("connection_id", flat=True)
+            .first()
+        )
+
+        self._webhook("webhook_connections", {"connection_id": connection_id, "state": "active"})
+        self._webhook(
+            "webhook_issue_credential",
+            {
+                "connection_id": connection_id,
+                "state": "request_received",
+                "credential_exchange_id": f"soak-cred-{self.flows}",
+            },
+        )
+
+        self._page("POST", "presentation-request")
+        presentation_exchange_id = (
+            ConnectionState.objects.filter(user=user)
+            .values_list("presentation_exchange_id", flat=True)
+            .first()
+        )
+        self._webhook(
+            "webhook_present_proof",
+            {
+                "connection_id": connection_id,
+                "presentation_exchange_id": presentation_exchange_id,
+                "state": "verified",
+                "verified": "true",
+                # Reused only for the tenant's credential definition
+                "presentation": {
+                    "identifiers": [{"cred_def_id": settings.TRACTION_CREDENTIAL_DEFINITION_ID}]
+                },
+            },
+        )
+
+        # Served from the verification cache
+        self._page("POST", "presentation-request")
+        self._webhook("webhook_ping", {"comment": "soak"})
+
+        self.flows += 1
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from student.traction_stub import get_stub_url, start_traction_stub
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the Traction tenant API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8021)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds added to every response",
+        )
+        parser.add_argument(
+            "--list-size",
+            type=int,
+            default=0,
+            help="Records served by each list endpoint",
+        )
+
+    def handle(self, *args, **options):
+        server = start_traction_stub(
+            options["host"], options["port"], options["latency"], options["list_size"]
+        )
+        self.stdout.write(
+            f"Traction stub listening on {get_stub_url(server)} "
+            "(set TRACTION_API_BASE_URL to this URL)"
+        )
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0002_connectionstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionstate',
+            name='tenant_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0003_connectionstate_tenant_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionstate',
+            name='connection_state',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='connectionstate',
+            index=models.Index(fields=['user', 'connection_state'], name='student_con_user_state_idx'),
+        ),
+    ]
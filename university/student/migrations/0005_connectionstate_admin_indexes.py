@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0004_connectionstate_connection_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='connectionstate',
+            name='connection_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='connectionstate',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='connectionstate',
+            name='presentation_exchange_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='connectionstate',
+            index=models.Index(fields=['state', 'updated_at'], name='student_con_state_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0006_jobcursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionstate',
+            name='credential_attributes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
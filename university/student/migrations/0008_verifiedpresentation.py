@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0007_credential_attributes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerifiedPresentation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proof_template', models.CharField(max_length=100)),
+                ('cred_def_id', models.CharField(blank=True, default='', max_length=255)),
+                ('attributes', models.JSONField(blank=True, default=dict)),
+                ('predicates', models.JSONField(blank=True, default=list)),
+                ('presentation_exchange_id', models.CharField(max_length=255, unique=True)),
+                ('verified_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'proof_template', '-verified_at'], name='student_ver_user_tmpl_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0008_verifiedpresentation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionstate',
+            name='connected_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='connectionstate',
+            name='issued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='connectionstate',
+            name='offer_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='connectionstate',
+            name='proof_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='connectionstate',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0009_flow_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connectionstate',
+            name='credential_exchange_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
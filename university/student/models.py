@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class Student(models.Model):
@@ -7,17 +8,82 @@ class Student(models.Model):
     department = models.CharField(max_length=100)
     course = models.CharField(max_length=100)
 
+    def __str__(self):
+        return f"{self.user.username} - {self.course}"
+
 
 class ConnectionState(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    connection_id = models.CharField(max_length=255)
+    connection_id = models.CharField(max_length=255, db_index=True)
     revocation_registry_id = models.CharField(max_length=255)
     revocation_id = models.CharField(max_length=255)
-    presentation_exchange_id = models.CharField(max_length=255)
+    presentation_exchange_id = models.CharField(max_length=255, db_index=True)
+    # Credential exchange of the flow's offer ("" until the offer is sent)
+    credential_exchange_id = models.CharField(max_length=255, blank=True, default="")
     state = models.CharField(max_length=50, default="NEW")
+    # Traction tenant that owns the connection ("" for rows created before multi-tenancy)
+    tenant_id = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    # DIDComm connection state as reported by Traction (invitation, request, response, active, ...)
+    connection_state = models.CharField(max_length=50, blank=True, default="")
+    # Credential attributes resolved when the invitation was created, so offers need no joins
+    credential_attributes = models.JSONField(blank=True, default=dict)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Flow stage timestamps, written with the state change they record (see flow_stats)
+    connected_at = models.DateTimeField(null=True, blank=True)
+    offer_sent_at = models.DateTimeField(null=True, blank=True)
+    issued_at = models.DateTimeField(null=True, blank=True)
+    proof_requested_at = models.DateTimeField(null=True, blank=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "connection_state"],
+                name="student_con_user_state_idx",
+            ),
+            models.Index(
+                fields=["state", "updated_at"],
+                name="student_con_state_upd_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.state}"
+
+
+class JobCursor(models.Model):
+    """Resume position of an incremental background job (last processed primary key)"""
+
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.position}"
+
+
+class VerifiedPresentation(models.Model):
+    """Outcome of a verified proof request, reused until it is too old"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Name of the proof request the presentation answered
+    proof_template = models.CharField(max_length=100)
+    cred_def_id = models.CharField(max_length=255, blank=True, default="")
+    # Revealed attributes ({name: raw value}) and satisfied predicates
+    attributes = models.JSONField(blank=True, default=dict)
+    predicates = models.JSONField(blank=True, default=list)
+    presentation_exchange_id = models.CharField(max_length=255, unique=True)
+    verified_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "proof_template", "-verified_at"],
+                name="student_ver_user_tmpl_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.proof_template} - {self.verified_at}"
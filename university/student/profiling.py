@@ -0,0 +1,182 @@
+"""
+Opt-in sampling profiler for production requests.
+
+A sampled request gets a helper thread that records the request thread's
+stack every PROFILER_INTERVAL seconds. Stacks are aggregated per view over a
+rolling PROFILER_WINDOW and can be dumped in the collapsed format read by
+flamegraph.pl / speedscope, or as a top-N hotspot table.
+
+The store lives in the memory of each worker process and is not shared: with
+several workers, each dump only shows the requests sampled by the worker that
+served it.
+"""
+
+import hmac
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler(threading.Thread):
+    """Thread sampling the stack of another thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileStore:
+    """Rolling, thread-safe store of sampled stacks per view"""
+
+    def __init__(self, window, max_profiles):
+        self.window = window
+        self._profiles = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, view, stacks):
+        now = time.monotonic()
+        with self._lock:
+            self._profiles.append((now, view, stacks))
+            while self._profiles and now - self._profiles[0][0] > self.window:
+                self._profiles.popleft()
+
+    def collapsed(self, view=None):
+        """
+        Aggregate the stacks of the current window
+
+        Args:
+            view: Only include requests to this view name (optional)
+
+        Returns:
+            dict: {view name: Counter of "frame;frame;..." -> samples}
+        """
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            profiles = [entry for entry in self._profiles if entry[0] >= cutoff]
+
+        aggregated = {}
+        for _, profile_view, stacks in profiles:
+            if view is None or profile_view == view:
+                aggregated.setdefault(profile_view, Counter()).update(stacks)
+        return aggregated
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = ProfileStore(
+    window=getattr(settings, "PROFILER_WINDOW", 600),
+    max_profiles=getattr(settings, "PROFILER_MAX_PROFILES", 1000),
+)
+
+
+def format_collapsed(aggregated):
+    """Render stacks as collapsed lines ("view;frame;frame count")"""
+    lines = []
+    for view, stacks in sorted(aggregated.items()):
+        for stack, count in stacks.most_common():
+            lines.append(f"{view};{stack} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def format_hotspots(aggregated, limit=20):
+    """Render the frames with the most self and total samples, per view"""
+    lines = []
+    for view, stacks in sorted(aggregated.items()):
+        total_samples = sum(stacks.values())
+        if not total_samples:
+            continue
+        self_samples = Counter()
+        inclusive_samples = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                inclusive_samples[frame] += count
+
+        lines.append(f"== {view} ({total_samples} samples)")
+        lines.append("  self%  total%  frame")
+        for frame, count in self_samples.most_common(limit):
+            lines.append(
+                f"  {100 * count / total_samples:5.1f}  "
+                f"{100 * inclusive_samples[frame] / total_samples:6.1f}  {frame}"
+            )
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profile a fraction of requests, or those selected by header or URL
+
+    Requests are profiled when random() < PROFILER_SAMPLE_RATE, when the
+    X-Profile header equals PROFILER_TOKEN, or when the path matches one of
+    PROFILER_PATHS. With none of these configured the middleware removes
+    itself from the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILER_SAMPLE_RATE", 0.0)
+        self.token = getattr(settings, "PROFILER_TOKEN", "")
+        self.paths = [re.compile(p) for p in getattr(settings, "PROFILER_PATHS", [])]
+        self.interval = getattr(settings, "PROFILER_INTERVAL", 0.005)
+
+        if not (self.sample_rate or self.token or self.paths):
+            raise MiddlewareNotUsed
+
+    def _should_profile(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if self.token and hmac.compare_digest(
+            request.headers.get("x-profile", "").encode(), self.token.encode()
+        ):
+            return True
+        return any(pattern.search(request.path) for pattern in self.paths)
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        if sampler.stacks:
+            match = request.resolver_match
+            view = match.view_name if match else request.path
+            profile_store.add(view, sampler.stacks)
+        return response
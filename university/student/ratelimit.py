@@ -0,0 +1,159 @@
+"""
+Token-bucket rate limiting of Traction-backed actions.
+
+Buckets live in the default cache so that all workers share them when the
+cache is shared (Redis, Memcached). Each Traction endpoint has a bucket per
+user and a global one; see TRACTION_RATE_LIMITS in settings.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class TokenBucket:
+    """Token bucket stored in the cache as (tokens, last refill timestamp)"""
+
+    def __init__(self, key: str, burst: float, refill_rate: float):
+        """
+        Initialize a token bucket
+
+        Args:
+            key: Cache key of the bucket
+            burst: Maximum number of tokens (requests allowed at once)
+            refill_rate: Tokens added per second
+        """
+        self.key = key
+        self.burst = burst
+        self.refill_rate = refill_rate
+
+    def available(self, now: float) -> float:
+        """
+        Return the tokens in the bucket, refilled up to now, without taking any
+
+        Args:
+            now: Current timestamp
+
+        Returns:
+            float: Available tokens
+        """
+        state = cache.get(self.key)
+        if state is None:
+            return self.burst
+        return min(self.burst, state[0] + (now - state[1]) * self.refill_rate)
+
+    def take(self, available: float, now: float, tokens: float = 1):
+        """
+        Store the bucket with tokens taken from what available() returned
+
+        Args:
+            available: Tokens returned by available()
+            now: Timestamp passed to available()
+            tokens: Tokens the request costs
+        """
+        # Once full again the bucket can simply expire
+        timeout = math.ceil(self.burst / self.refill_rate) + 1 if self.refill_rate else None
+        cache.set(self.key, (available - tokens, now), timeout)
+
+    def consume(self, tokens: float = 1) -> bool:
+        """
+        Take tokens from the bucket if enough are available
+
+        The read-modify-write is not atomic across workers, so concurrent
+        requests can occasionally overdraw the bucket by a token or two.
+
+        Args:
+            tokens: Tokens the request costs
+
+        Returns:
+            bool: True if the request is allowed
+        """
+        now = time.time()
+        available = self.available(now)
+        if available < tokens:
+            return False
+        self.take(available, now, tokens)
+        return True
+
+
+def _count(endpoint, outcome):
+    key = f"ratelimit_{outcome}_{endpoint}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def allow_request(endpoint, user):
+    """
+    Check the per-user and the global bucket of a Traction endpoint
+
+    A token is taken from the buckets only when all of them allow the request.
+    Endpoints without an entry in TRACTION_RATE_LIMITS are not limited.
+
+    Args:
+        endpoint: Rate-limited endpoint name (e.g. "create-invitation")
+        user: Django user making the request
+
+    Returns:
+        bool: True if the request may go to Traction, False if it is shed
+    """
+    limits = getattr(settings, "TRACTION_RATE_LIMITS", {}).get(endpoint)
+    if not limits:
+        return True
+
+    buckets = []
+    if "user" in limits:
+        buckets.append(
+            TokenBucket(
+                f"ratelimit_bucket_{endpoint}_user_{user.pk}",
+                limits["user"]["burst"],
+                limits["user"]["refill"],
+            )
+        )
+    if "global" in limits:
+        buckets.append(
+            TokenBucket(
+                f"ratelimit_bucket_{endpoint}_global",
+                limits["global"]["burst"],
+                limits["global"]["refill"],
+            )
+        )
+
+    # Check every bucket before taking from any: a request shed by the
+    # global bucket must not cost the user a token, and vice versa
+    now = time.time()
+    available = [bucket.available(now) for bucket in buckets]
+    allowed = all(tokens >= 1 for tokens in available)
+    if allowed:
+        for bucket, tokens in zip(buckets, available):
+            bucket.take(tokens, now)
+    _count(endpoint, "allowed" if allowed else "shed")
+    return allowed
+
+
+def get_counters():
+    """
+    Return the allowed/shed counters of every rate-limited endpoint
+
+    Returns:
+        dict: {endpoint: {"allowed": int, "shed": int}}
+    """
+    endpoints = list(getattr(settings, "TRACTION_RATE_LIMITS", {}))
+    keys = [
+        f"ratelimit_{outcome}_{endpoint}"
+        for endpoint in endpoints
+        for outcome in ("allowed", "shed")
+    ]
+    values = cache.get_many(keys)
+    return {
+        endpoint: {
+            outcome: values.get(f"ratelimit_{outcome}_{endpoint}", 0)
+            for outcome in ("allowed", "shed")
+        }
+        for endpoint in endpoints
+    }
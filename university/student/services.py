@@ -0,0 +1,912 @@
+"""
+Issuance and verification flows shared by the views and the webhook handlers.
+"""
+
+import datetime
+from collections import defaultdict
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .EnumState import StateModelEnum
+from .models import ConnectionState, Student, VerifiedPresentation
+from .traction_django import get_tenant_config, get_tenant_for_wallet, get_traction_client
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_CONNECTION_STATE = "active"
+# Name of the proof request sent by send_proof_request
+STUDENT_PROOF_TEMPLATE = "proof-request"
+FLOW_TOKEN_SALT = "student.flow"
+# Flow states holding an issued credential
+ISSUED_STATES = (StateModelEnum.CREDENTIAL_ISSUED.value, StateModelEnum.REVOKED.value)
+
+_MISSING = object()
+
+
+def _active_connection_cache_key(user_id):
+    return f"student_active_connection_{user_id}"
+
+
+def get_active_connection(user):
+    """
+    Return the user's most recent flow with an active DIDComm connection
+
+    The result (including "no active connection") is cached per user for
+    ACTIVE_CONNECTION_CACHE_TIMEOUT seconds and invalidated whenever a
+    webhook changes the connection state.
+
+    Args:
+        user: Django user
+
+    Returns:
+        ConnectionState or None
+    """
+    cache_key = _active_connection_cache_key(user.pk)
+    state_model = cache.get(cache_key, _MISSING)
+
+    if state_model is _MISSING:
+        state_model = (
+            ConnectionState.objects.filter(
+                user=user, connection_state=ACTIVE_CONNECTION_STATE
+            )
+            .order_by("-pk")
+            .first()
+        )
+        cache.set(
+            cache_key,
+            state_model,
+            getattr(settings, "ACTIVE_CONNECTION_CACHE_TIMEOUT", 300),
+        )
+
+    return state_model
+
+
+def invalidate_active_connection(user_id):
+    """Drop the cached active connection of a user"""
+    cache.delete(_active_connection_cache_key(user_id))
+
+
+def _pending_invitation_cache_key(user_id):
+    return f"student_pending_invitation_{user_id}"
+
+
+def set_pending_invitation(user_id, context):
+    """
+    Remember the invitation page of a user's pending invitation
+
+    Args:
+        user_id: Django user ID
+        context: Rendered credential page context (QR code, invitation URL/JSON)
+    """
+    cache.set(
+        _pending_invitation_cache_key(user_id),
+        context,
+        getattr(settings, "PENDING_INVITATION_CACHE_TIMEOUT", 3600),
+    )
+
+
+def get_pending_invitation(user_id):
+    """Return the page context of the user's pending invitation, if any"""
+    return cache.get(_pending_invitation_cache_key(user_id))
+
+
+def clear_pending_invitation(user_id):
+    """Forget the user's pending invitation once its connection is made"""
+    cache.delete(_pending_invitation_cache_key(user_id))
+
+
+def make_flow_token(state_model):
+    """
+    Sign a stateless handle on a flow, carried in the page instead of the session
+
+    Args:
+        state_model: ConnectionState the page is about
+
+    Returns:
+        str: URL-safe signed token
+    """
+    return signing.dumps(
+        {
+            "id": state_model.pk,
+            "user": state_model.user_id,
+            "connection_id": state_model.connection_id,
+            "tenant_id": state_model.tenant_id,
+        },
+        salt=FLOW_TOKEN_SALT,
+        compress=True,
+    )
+
+
+def read_flow_token(token, user):
+    """
+    Resolve a flow token without touching the database
+
+    Args:
+        token: Token made by make_flow_token
+        user: Django user submitting the token
+
+    Returns:
+        ConnectionState: Unsaved instance with the flow's pk, user, connection
+        and tenant, or None if the token is missing, tampered with, older than
+        FLOW_TOKEN_MAX_AGE or issued to another user
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(
+            token,
+            salt=FLOW_TOKEN_SALT,
+            max_age=getattr(settings, "FLOW_TOKEN_MAX_AGE", 3600),
+        )
+    except signing.BadSignature:
+        return None
+    if data.get("user") != user.pk:
+        return None
+    return ConnectionState(
+        pk=data["id"],
+        user_id=data["user"],
+        connection_id=data["connection_id"],
+        tenant_id=data["tenant_id"],
+    )
+
+
+def get_flow_for_token(token, user):
+    """
+    Resolve a flow token to the user's flow row
+
+    The signature alone only proves the token was made with SECRET_KEY; the
+    flow is also looked up so that a token can only act on a flow the user
+    still owns, with the connection and tenant stored in the database.
+
+    Args:
+        token: Token made by make_flow_token
+        user: Django user submitting the token
+
+    Returns:
+        ConnectionState or None
+    """
+    flow = read_flow_token(token, user)
+    if flow is None:
+        return None
+    return (
+        ConnectionState.objects.filter(pk=flow.pk, user=user)
+        .only("pk", "user_id", "connection_id", "tenant_id")
+        .first()
+    )
+
+
+def _verification_cache_key(user_id, proof_template, cred_def_id):
+    return f"student_verification_{user_id}_{proof_template}_{cred_def_id}"
+
+
+def get_recent_verification(
+    user, cred_def_id, proof_template=STUDENT_PROOF_TEMPLATE, max_age=None
+):
+    """
+    Return the user's latest verified presentation if it is recent enough
+
+    Only presentations of the given credential definition are reused, so a
+    proof of another tenant's credential never answers this one. The latest
+    verification (including "none") is cached per user, proof template and
+    credential definition for VERIFICATION_CACHE_TIMEOUT seconds; the age is
+    checked on every call. A reused predicate was proven at verified_at, so
+    max_age also bounds how stale e.g. the "not expired" check may be.
+
+    Args:
+        user: Django user
+        cred_def_id: Credential definition the presentation must come from
+        proof_template: Name of the proof request
+        max_age: Maximum age in seconds (default: VERIFICATION_MAX_AGE, 0 disables reuse)
+
+    Returns:
+        VerifiedPresentation or None
+    """
+    if max_age is None:
+        max_age = getattr(settings, "VERIFICATION_MAX_AGE", 3600)
+    if not max_age or not cred_def_id:
+        return None
+
+    cache_key = _verification_cache_key(user.pk, proof_template, cred_def_id)
+    verification = cache.get(cache_key, _MISSING)
+
+    if verification is _MISSING:
+        # Served by the (user, proof_template, -verified_at) index
+        verification = (
+            VerifiedPresentation.objects.filter(
+                user=user, proof_template=proof_template, cred_def_id=cred_def_id
+            )
+            .order_by("-verified_at")
+            .first()
+        )
+        cache.set(
+            cache_key,
+            verification,
+            getattr(settings, "VERIFICATION_CACHE_TIMEOUT", 300),
+        )
+
+    if verification is None or verification.verified_at < timezone.now() - datetime.timedelta(
+        seconds=max_age
+    ):
+        return None
+    return verification
+
+
+def _presentation_data(body):
+    """Extract the revealed attributes, predicates and cred_def_id of a presentation record"""
+    proof_request = body.get("presentation_request") or {}
+    presentation = body.get("presentation") or {}
+    requested_proof = presentation.get("requested_proof") or {}
+    revealed_attrs = requested_proof.get("revealed_attrs") or {}
+    revealed_groups = requested_proof.get("revealed_attr_groups") or {}
+
+    attributes = {}
+    for referent, spec in (proof_request.get("requested_attributes") or {}).items():
+        if referent in revealed_groups:
+            for name, value in revealed_groups[referent].get("values", {}).items():
+                attributes[name] = value.get("raw")
+        elif referent in revealed_attrs:
+            attributes[spec.get("name", referent)] = revealed_attrs[referent].get("raw")
+
+    proven = requested_proof.get("predicates") or {}
+    predicates = [
+        {"name": spec.get("name"), "p_type": spec.get("p_type"), "p_value": spec.get("p_value")}
+        for referent, spec in (proof_request.get("requested_predicates") or {}).items()
+        if referent in proven
+    ]
+
+    identifiers = presentation.get("identifiers") or [{}]
+    return {
+        "proof_template": proof_request.get("name") or STUDENT_PROOF_TEMPLATE,
+        "cred_def_id": identifiers[0].get("cred_def_id") or "",
+        "attributes": attributes,
+        "predicates": predicates,
+    }
+
+
+def record_verification(state_model, body):
+    """
+    Persist a verified presentation so later checks can skip the wallet round trip
+
+    Args:
+        state_model: ConnectionState the proof was requested on
+        body: Presentation exchange record sent by Traction (state = verified)
+
+    Returns:
+        VerifiedPresentation
+    """
+    data = _presentation_data(body)
+    verification, _ = VerifiedPresentation.objects.get_or_create(
+        presentation_exchange_id=body.get("presentation_exchange_id"),
+        defaults={
+            "user_id": state_model.user_id,
+            "verified_at": parse_datetime(body.get("updated_at") or "") or timezone.now(),
+            **data,
+        },
+    )
+    cache.delete(
+        _verification_cache_key(
+            state_model.user_id, verification.proof_template, verification.cred_def_id
+        )
+    )
+    return verification
+
+
+def forget_verifications(user_ids, cred_def_id):
+    """
+    Delete the stored verifications of a credential definition for some users
+
+    Called when their credentials are revoked: a presentation made before
+    the revocation must not be reused afterwards.
+
+    Args:
+        user_ids: Django user IDs
+        cred_def_id: Credential definition of the revoked credentials
+
+    Returns:
+        int: Number of verifications deleted
+    """
+    verifications = VerifiedPresentation.objects.filter(
+        user_id__in=user_ids, cred_def_id=cred_def_id
+    )
+    cache.delete_many(
+        [
+            _verification_cache_key(user_id, proof_template, cred_def_id)
+            for user_id, proof_template in verifications.values_list(
+                "user_id", "proof_template"
+            ).distinct()
+        ]
+    )
+    deleted, _ = verifications.delete()
+    return deleted
+
+
+def credential_expiry():
+    """
+    Return the expiry date of a credential offered today
+
+    Returns:
+        str: YYYYMMDD date, CREDENTIAL_VALIDITY_DAYS from today or the fixed CREDENTIAL_DATA one
+    """
+    validity_days = getattr(settings, "CREDENTIAL_VALIDITY_DAYS", 0)
+    if validity_days:
+        return (
+            timezone.localdate() + datetime.timedelta(days=validity_days)
+        ).strftime("%Y%m%d")
+    return settings.CREDENTIAL_DATA.get("expires")
+
+
+def snapshot_credential_attributes(user, student=None):
+    """
+    Resolve the credential attributes of a user when the invitation is created
+
+    The snapshot is taken again when a new offer is sent on a reused connection.
+
+    Args:
+        user: Django user
+        student: The user's Student profile, if already loaded (optional)
+
+    Returns:
+        dict: Attribute values, stored in ConnectionState.credential_attributes
+    """
+    if student is None:
+        student = Student.objects.filter(user_id=user.pk).only("department", "course").first()
+
+    return {
+        "given_name": user.first_name,
+        "family_name": user.last_name,
+        "expires": credential_expiry(),
+        "department": student.department if student else "",
+        "course": student.course if student else "",
+    }
+
+
+def _credential_offer_body(connection_id, tenant_id, attributes):
+    names = getattr(
+        settings, "CREDENTIAL_ATTRIBUTES", ["given_name", "family_name", "expires"]
+    )
+    return {
+        "auto_issue": settings.CREDENTIAL_AUTO_ISSUE,
+        "auto_remove": False,
+        "connection_id": connection_id,
+        "cred_def_id": get_tenant_config(tenant_id or None)["credential_definition_id"],
+        "trace": False,
+        "credential_preview": {
+            "@type": "issue-credential/1.0/credential-preview",
+            "attributes": [
+                {"name": name, "value": attributes.get(name, "")} for name in names
+            ],
+        },
+    }
+
+
+def build_credential_offer(state_model):
+    """
+    Build the send-offer request body of a flow
+
+    The attributes come from the snapshot taken at invitation time; flows
+    created before snapshots existed fall back to the live user data.
+
+    Args:
+        state_model: ConnectionState to offer the credential on
+
+    Returns:
+        dict: Body for /issue-credential/send-offer
+    """
+    attributes = state_model.credential_attributes or snapshot_credential_attributes(
+        state_model.user
+    )
+    return _credential_offer_body(
+        state_model.connection_id, state_model.tenant_id, attributes
+    )
+
+
+def _needs_new_flow(state):
+    """Whether a new offer on a flow's connection needs a flow row of its own"""
+    # The row holds an issued credential: its revocation IDs must not be overwritten
+    return state in ISSUED_STATES
+
+
+def _reoffer_flow(state_model, now, **fields):
+    """Create the flow of a new offer on the connection of an issued flow"""
+    return ConnectionState(
+        user_id=state_model.user_id,
+        connection_id=state_model.connection_id,
+        tenant_id=state_model.tenant_id,
+        connection_state=state_model.connection_state,
+        revocation_registry_id="",
+        revocation_id="",
+        presentation_exchange_id="",
+        state=StateModelEnum.OFFER_SENT.value,
+        offer_sent_at=now,
+        **fields,
+    )
+
+
+def send_credential_offer(state_model, user=None):
+    """
+    Offer the student credential over the flow's connection
+
+    An offer on the connection of a flow whose credential was already issued
+    starts a new flow row, so the issued one keeps its revocation IDs and
+    stage timestamps.
+
+    Args:
+        state_model: ConnectionState whose connection is active
+        user: The flow's user, to snapshot the attributes again (optional). Pass
+            it for a new offer on a reused connection, whose snapshot (and
+            expiry date) may be stale; the new snapshot is saved with the offer.
+
+    Returns:
+        ConnectionState: The flow the offer was sent on
+    """
+    logger.info("Sending credential offer.")
+
+    fields = {}
+    if user is not None:
+        state_model.credential_attributes = snapshot_credential_attributes(user)
+        fields["credential_attributes"] = state_model.credential_attributes
+
+    _client = get_traction_client(state_model.tenant_id or None)
+    offer_data = _client.send_traction_request(
+        endpoint="/issue-credential/send-offer",
+        body=build_credential_offer(state_model),
+    )
+    fields["credential_exchange_id"] = offer_data.get("credential_exchange_id") or ""
+
+    now = timezone.now()
+    if _needs_new_flow(state_model.state):
+        state_model = _reoffer_flow(
+            state_model,
+            now,
+            credential_attributes=state_model.credential_attributes,
+            credential_exchange_id=fields["credential_exchange_id"],
+        )
+        state_model.save()
+    else:
+        # A new offer starts a new "offer sent -> issued" stage
+        ConnectionState.objects.filter(pk=state_model.pk).update(
+            state=StateModelEnum.OFFER_SENT.value,
+            updated_at=now,
+            offer_sent_at=now,
+            issued_at=None,
+            **fields,
+        )
+        state_model.state = StateModelEnum.OFFER_SENT.value
+        state_model.offer_sent_at = now
+        state_model.issued_at = None
+        state_model.credential_exchange_id = fields["credential_exchange_id"]
+    invalidate_active_connection(state_model.user_id)
+
+    return state_model
+
+
+def send_credential_offers(queryset, batch_size=500):
+    """
+    Re-send credential offers for every flow of a queryset with an active connection
+
+    Flows are read in batches and their state (and the offer's credential
+    exchange ID) is updated with one UPDATE per batch; flows whose offer
+    fails are left unchanged. Offers on the connection of an issued flow
+    start new flow rows, created with one INSERT per batch. The snapshotted
+    attributes are re-sent with a current expiry date.
+
+    Args:
+        queryset: ConnectionState queryset
+        batch_size: Rows fetched and updated per query
+
+    Returns:
+        tuple: (offers sent, offers failed)
+    """
+    # Offers are built from the attribute snapshots: no User/Student joins
+    rows = (
+        queryset.filter(connection_state=ACTIVE_CONNECTION_STATE)
+        .order_by("pk")
+        .values(
+            "pk",
+            "user_id",
+            "connection_id",
+            "tenant_id",
+            "connection_state",
+            "state",
+            "credential_attributes",
+        )
+    )
+    sent = failed = 0
+    batch = []
+    # The snapshot's expiry was computed when the flow's invitation was created
+    expires = credential_expiry()
+
+    def flush():
+        now = timezone.now()
+        # Each offer has its own credential exchange: one CASE-based UPDATE per batch
+        ConnectionState.objects.bulk_update(
+            [
+                ConnectionState(
+                    pk=row["pk"],
+                    state=StateModelEnum.OFFER_SENT.value,
+                    updated_at=now,
+                    offer_sent_at=now,
+                    issued_at=None,
+                    credential_exchange_id=row["credential_exchange_id"],
+                )
+                for row in batch
+                if not _needs_new_flow(row["state"])
+            ],
+            ["state", "updated_at", "offer_sent_at", "issued_at", "credential_exchange_id"],
+        )
+        ConnectionState.objects.bulk_create(
+            [
+                _reoffer_flow(
+                    ConnectionState(**row),
+                    now,
+                    credential_attributes=row["credential_attributes"],
+                    credential_exchange_id=row["credential_exchange_id"],
+                )
+                for row in batch
+                if _needs_new_flow(row["state"])
+            ]
+        )
+        for row in batch:
+            invalidate_active_connection(row["user_id"])
+        batch.clear()
+
+    for row in rows.iterator(chunk_size=batch_size):
+        try:
+            attributes = row["credential_attributes"] or snapshot_credential_attributes(
+                User.objects.get(pk=row["user_id"])
+            )
+            offer_data = get_traction_client(row["tenant_id"] or None).send_traction_request(
+                endpoint="/issue-credential/send-offer",
+                body=_credential_offer_body(
+                    row["connection_id"], row["tenant_id"], {**attributes, "expires": expires}
+                ),
+            )
+        except Exception as err:
+            logger.error(err)
+            failed += 1
+            continue
+        row["credential_attributes"] = attributes
+        row["credential_exchange_id"] = offer_data.get("credential_exchange_id") or ""
+        batch.append(row)
+        sent += 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    return sent, failed
+
+
+def expire_flows(queryset):
+    """
+    Mark unfinished flows as expired with a single UPDATE
+
+    The cached active connection of every affected user is dropped, so the
+    issue page stops offering over an expired flow.
+
+    Args:
+        queryset: ConnectionState queryset
+
+    Returns:
+        int: Number of flows expired
+    """
+    unfinished = queryset.filter(
+        state__in=[
+            StateModelEnum.CONNECTION_INVITATION.value,
+            StateModelEnum.OFFER_SENT.value,
+        ]
+    )
+    user_ids = set(unfinished.values_list("user_id", flat=True))
+    expired = unfinished.update(state=StateModelEnum.EXPIRED.value, updated_at=timezone.now())
+    for user_id in user_ids:
+        invalidate_active_connection(user_id)
+    return expired
+
+
+def revoke_credentials(queryset, batch_size=500):
+    """
+    Revoke the credentials issued on a queryset of flows
+
+    Revocations are queued per credential without publishing, then published
+    once per tenant. Flows are only marked as revoked, with one UPDATE per
+    batch, after their tenant's revocations were published; the stored
+    verifications of the revoked credentials are deleted at the same time.
+
+    Args:
+        queryset: ConnectionState queryset
+        batch_size: Rows fetched and updated per query
+
+    Returns:
+        tuple: (credentials revoked, revocations failed)
+    """
+    state_models = (
+        queryset.filter(state=StateModelEnum.CREDENTIAL_ISSUED.value)
+        .exclude(revocation_registry_id="")
+        .exclude(revocation_id="")
+        .select_related(None)
+        .only(
+            "pk",
+            "user_id",
+            "connection_id",
+            "revocation_registry_id",
+            "revocation_id",
+            "tenant_id",
+        )
+        .order_by("pk")
+    )
+    revoked = failed = 0
+    # tenant -> (pk, user_id) of the flows whose revocation is queued
+    pending = defaultdict(list)
+
+    for state_model in state_models.iterator(chunk_size=batch_size):
+        tenant_id = state_model.tenant_id or None
+        try:
+            get_traction_client(tenant_id).send_traction_request(
+                endpoint="/revocation/revoke",
+                body={
+                    "rev_reg_id": state_model.revocation_registry_id,
+                    "cred_rev_id": state_model.revocation_id,
+                    "connection_id": state_model.connection_id,
+                    "publish": False,
+                    "notify": True,
+                },
+            )
+        except Exception as err:
+            logger.error(err)
+            failed += 1
+            continue
+        pending[tenant_id].append((state_model.pk, state_model.user_id))
+
+    # One registry update per tenant instead of one per credential
+    for tenant_id, flows in pending.items():
+        try:
+            get_traction_client(tenant_id).send_traction_request(
+                endpoint="/revocation/publish-revocations", body={}
+            )
+        except Exception as err:
+            # The revocations stay queued in Traction; the flows stay issued
+            logger.error(err)
+            failed += len(flows)
+            continue
+        cred_def_id = get_tenant_config(tenant_id)["credential_definition_id"]
+        for start in range(0, len(flows), batch_size):
+            pks, user_ids = zip(*flows[start : start + batch_size])
+            ConnectionState.objects.filter(pk__in=pks).update(
+                state=StateModelEnum.REVOKED.value, updated_at=timezone.now()
+            )
+            forget_verifications(set(user_ids), cred_def_id)
+        revoked += len(flows)
+
+    return revoked, failed
+
+
+def send_proof_request(state_model, proof_template=STUDENT_PROOF_TEMPLATE):
+    """
+    Request a proof of the student credential over the flow's connection
+
+    Args:
+        state_model: ConnectionState whose connection is active
+        proof_template: Name of the proof request, used to find its verifications later
+
+    Returns:
+        Traction response data
+    """
+    tenant_id = state_model.tenant_id or None
+    cred_def_id = get_tenant_config(tenant_id)["credential_definition_id"]
+    body = {
+        "connection_id": state_model.connection_id,
+        "auto_verify": False,
+        "trace": False,
+        "proof_request": {
+            "name": proof_template,
+            "nonce": "1234567890",
+            "version": "1.0",
+            "requested_attributes": {
+                "demo_attributes": {
+                    "names": ["given_name", "family_name"],
+                    "restrictions": [{"cred_def_id": cred_def_id}],
+                }
+            },
+            "requested_predicates": {
+                "not_expired": {
+                    "name": "expires",
+                    "p_type": ">=",
+                    "p_value": datetime.date.today()
+                    .isoformat()
+                    .replace(
+                        "-", ""
+                    ),  # Number.parseInt(new Date().toISOString().substring(0, 10).replace(/-/g, '')),
+                    "restrictions": [{"cred_def_id": cred_def_id}],
+                }
+            },
+        },
+    }
+
+    _client = get_traction_client(tenant_id)
+    send_request_data = _client.send_traction_request(
+        endpoint="/present-proof/send-request", body=body
+    )
+    logger.info(send_request_data)
+
+    presentation_exchange_id = send_request_data.get("presentation_exchange_id") or ""
+    now = timezone.now()
+    ConnectionState.objects.filter(pk=state_model.pk).update(
+        presentation_exchange_id=presentation_exchange_id,
+        updated_at=now,
+        proof_requested_at=now,
+        verified_at=None,
+    )
+    state_model.presentation_exchange_id = presentation_exchange_id
+    state_model.proof_requested_at = now
+    state_model.verified_at = None
+    invalidate_active_connection(state_model.user_id)
+
+    return send_request_data
+
+
+## Webhook handlers ##
+def _get_state_model(body, wallet_id=None, **filters):
+    """Find the flow a webhook refers to, scoped to the sending tenant when known"""
+    state_models = ConnectionState.objects.filter(
+        connection_id=body.get("connection_id"), **filters
+    )
+    tenant_id = get_tenant_for_wallet(wallet_id)
+    if tenant_id:
+        state_models = state_models.filter(tenant_id__in=[tenant_id, ""])
+    elif wallet_id:
+        # Connection IDs are UUIDs: an unmapped wallet still finds its flow
+        logger.warning(f"No Traction tenant configured for wallet {wallet_id}")
+    # A reused connection has one flow per offer: events belong to the latest one
+    return state_models.order_by("-pk").first()
+
+
+def handle_connections_event(body, wallet_id=None):
+    """
+    Apply a connections event: track the connection and offer the credential once active
+
+    Args:
+        body: Connection record sent by Traction
+        wallet_id: Traction tenant that sent the event (optional)
+    """
+    logger.info(body.get("connection_id"))
+    logger.info(body.get("state"))
+    state_model = _get_state_model(body, wallet_id)
+
+    if state_model is None:
+        return
+
+    # Track the DIDComm connection lifecycle so the connection can be reused
+    state_model.connection_state = body.get("state") or ""
+    update_fields = ["connection_state", "updated_at"]
+    if body.get("state") == ACTIVE_CONNECTION_STATE and state_model.connected_at is None:
+        state_model.connected_at = timezone.now()
+        update_fields.append("connected_at")
+    state_model.save(update_fields=update_fields)
+    # Earlier flows of a reused connection share its state
+    ConnectionState.objects.filter(
+        connection_id=state_model.connection_id, tenant_id=state_model.tenant_id
+    ).exclude(pk=state_model.pk).update(connection_state=state_model.connection_state)
+    invalidate_active_connection(state_model.user_id)
+
+    if body.get("state") == ACTIVE_CONNECTION_STATE:
+        clear_pending_invitation(state_model.user_id)
+
+    # Unless the connection is made (state = active) and we're in the correct state, we just wait
+    if (
+        body.get("state") != ACTIVE_CONNECTION_STATE
+        or state_model.state != StateModelEnum.CONNECTION_INVITATION.value
+    ):
+        return
+
+    # # Now that the connection is made, offer the credential
+    send_credential_offer(state_model)
+
+
+def handle_issue_credential_event(body, wallet_id=None):
+    """
+    Apply an issue-credential event: issue on request and record the revocation info
+
+    Args:
+        body: Credential exchange record sent by Traction
+        wallet_id: Traction tenant that sent the event (optional)
+    """
+    state_model = _get_state_model(body, wallet_id)
+
+    if state_model is None:
+        return
+
+    # If state = abandoned then user declined
+    if (
+        body.get("state") == "abandoned"
+        and state_model.state == StateModelEnum.OFFER_SENT.value
+    ):
+        logger.info("User declined offer.")
+
+    # If state = credential_acked or credential_issued then user received the credential in their wallet
+    if body.get("state") in [
+        "credential_acked",
+        "credential_issued",
+    ] and state_model.state in [
+        StateModelEnum.OFFER_SENT.value,
+        StateModelEnum.CREDENTIAL_ISSUED.value,
+    ]:
+        # With auto-issue the request_received event may never have been seen
+        # (lost webhook, reconcile): the issued record alone completes the flow
+        issued = state_model.state == StateModelEnum.OFFER_SENT.value
+        state_model.state = StateModelEnum.CREDENTIAL_ISSUED.value
+        # Issuance time is when Traction issued the credential, not when it was requested
+        if state_model.issued_at is None:
+            state_model.issued_at = timezone.now()
+        state_model.revocation_registry_id = body.get("revocation_registry_id") or ""
+        state_model.revocation_id = body.get("revocation_id") or ""
+        state_model.save()
+        if issued:
+            invalidate_active_connection(state_model.user_id)
+        logger.info("Issuance complete.")
+
+    # If state = request_received then we received the credential request
+    if (
+        body.get("state") == "request_received"
+        and state_model.state == StateModelEnum.OFFER_SENT.value
+    ):
+        # If we're not auto-issuing the credential then we must manually issue
+        if not body.get("auto_issue"):
+            logger.info("Issuing credential.")
+            _client = get_traction_client(state_model.tenant_id or None)
+            _client.send_traction_request(
+                f"/issue-credential/records/{body.get('credential_exchange_id')}/issue"
+            )
+        state_model.state = StateModelEnum.CREDENTIAL_ISSUED.value
+        state_model.save()
+        # The cached active connection still carries the offer state
+        invalidate_active_connection(state_model.user_id)
+
+
+def handle_present_proof_event(body, wallet_id=None):
+    """
+    Apply a present-proof event: record a verified presentation and close the pending request
+
+    Args:
+        body: Presentation exchange record sent by Traction
+        wallet_id: Traction tenant that sent the event (optional)
+    """
+    if not body.get("presentation_exchange_id"):
+        return
+    # The proof may have been requested on an earlier flow of the connection
+    state_model = _get_state_model(
+        body, wallet_id, presentation_exchange_id=body["presentation_exchange_id"]
+    )
+
+    if state_model is None:
+        return
+
+    if body.get("state") == "verified":
+        logger.info("User presented successfully.")
+        if str(body.get("verified")).lower() == "true":
+            record_verification(state_model, body)
+            state_model.verified_at = timezone.now()
+        state_model.presentation_exchange_id = ""
+        state_model.save()
+    elif body.get("state") == "abandoned":
+        logger.info("User declined presentation.")
+        state_model.presentation_exchange_id = ""
+        state_model.save()
+
+
+def handle_ping_event(body, wallet_id=None):
+    """Apply a ping event (logged only)"""
+    logger.info(body)
+
+
+# Webhook topic -> handler, shared by the webhook views and the replay tooling
+WEBHOOK_HANDLERS = {
+    "connections": handle_connections_event,
+    "issue_credential": handle_issue_credential_event,
+    "present_proof": handle_present_proof_event,
+    "ping": handle_ping_event,
+}
@@ -1,3 +1,899 @@
-from django.test import TestCase
+import hashlib
+import datetime
+import gzip
+import hmac
+import io
+import json
+import gc
+import os
+import tempfile
+import time
+from unittest import mock
+from urllib.parse import quote
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .EnumState import StateModelEnum
+from .models import ConnectionState, Student, VerifiedPresentation
+from .management.commands.flow_stats import stage_stats
+from .management.commands.import_students import Command as ImportStudentsCommand
+from .event_log import (
+    _flush_at_exit,
+    get_log_files,
+    get_process_log_path,
+    iter_events,
+    record_event,
+)
+from .profiling import profile_store
+from .ratelimit import TokenBucket, allow_request, get_counters
+from .services import (
+    FLOW_TOKEN_SALT,
+    WEBHOOK_HANDLERS,
+    handle_connections_event,
+    credential_expiry,
+    expire_flows,
+    get_flow_for_token,
+    get_recent_verification,
+    handle_issue_credential_event,
+    make_flow_token,
+    read_flow_token,
+    revoke_credentials,
+    send_credential_offers,
+)
+from .traction_api import TractionAPI, TractionAPIError
+from .traction_django import TractionDjangoClient
+from .traction_stub import get_stub_url, start_traction_stub
+from .webhook_views import webhook_ping
+from .webhooks import WebhookDispatcher, WebhookWSGIHandler
+
+# A single configured tenant, with no rate limiting
+TRACTION_SETTINGS = {
+    "TRACTION_TENANT_ID": "t1",
+    "TRACTION_API_KEY": "key",
+    # Wallet IDs differ from tenant IDs in Traction
+    "TRACTION_WALLET_ID": "wallet-1",
+    "TRACTION_API_BASE_URL": "http://traction.invalid",
+    "TRACTION_CREDENTIAL_DEFINITION_ID": "t1:3:CL:1:student",
+    "TRACTION_TENANTS": {},
+    "TRACTION_RATE_LIMITS": {},
+}
+INVITATION = {
+    "connection_id": "new-conn",
+    "invitation": {"@id": "invitation"},
+    "invitation_url": "http://traction.invalid/?c_i=new-conn",
+}
+
+
+class FakeTractionClient:
+    """Records Traction calls; endpoints listed in ``failing`` raise TractionAPIError"""
+
+    def __init__(self, responses=None, failing=()):
+        self.responses = responses or {}
+        self.failing = set(failing)
+        self.calls = []
+
+    def send_traction_request(self, endpoint, body={}, params=None, method="POST"):
+        self.calls.append((endpoint, body))
+        if endpoint in self.failing:
+            raise TractionAPIError(f"{endpoint} failed", status_code=500)
+        return self.responses.get(endpoint, {})
+
+
+@override_settings(WEBHOOK_API_KEY="test-key", WEBHOOK_HMAC_SECRET="", WEBHOOK_MAX_BODY_SIZE=1024)
+@mock.patch("student.webhook_views.record_event")
+class WebhookAuthTests(SimpleTestCase):
+    body = json.dumps({"comment": "test"}).encode()
+
+    def post(self, body=None, **headers):
+        request = RequestFactory().post(
+            "/topic/ping/",
+            self.body if body is None else body,
+            content_type="application/json",
+            **headers,
+        )
+        return webhook_ping(request)
+
+    def test_valid_key(self, record_event):
+        self.assertEqual(self.post(HTTP_X_API_KEY="test-key").status_code, 200)
+        record_event.assert_called_once()
+
+    def test_missing_or_wrong_key(self, record_event):
+        self.assertEqual(self.post().status_code, 401)
+        self.assertEqual(self.post(HTTP_X_API_KEY="wrong").status_code, 401)
+        record_event.assert_not_called()
+
+    @override_settings(WEBHOOK_API_KEY="")
+    def test_unconfigured_key_fails_closed(self, record_event):
+        self.assertEqual(self.post().status_code, 401)
+        self.assertEqual(self.post(HTTP_X_API_KEY="").status_code, 401)
+        record_event.assert_not_called()
+
+    def test_method_not_allowed(self, record_event):
+        response = webhook_ping(RequestFactory().get("/topic/ping/", HTTP_X_API_KEY="test-key"))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response["Allow"], "POST")
+
+    def test_body_too_large(self, record_event):
+        response = self.post(json.dumps({"comment": "x" * 2048}).encode(), HTTP_X_API_KEY="test-key")
+        self.assertEqual(response.status_code, 413)
+        record_event.assert_not_called()
+
+    @override_settings(WEBHOOK_HMAC_SECRET="hmac-secret")
+    def test_hmac_signature(self, record_event):
+        signature = hmac.new(b"hmac-secret", self.body, hashlib.sha256).hexdigest()
+        self.assertEqual(
+            self.post(HTTP_X_API_KEY="test-key", HTTP_X_SIGNATURE=signature).status_code, 200
+        )
+        self.assertEqual(self.post(HTTP_X_API_KEY="test-key").status_code, 401)
+        self.assertEqual(
+            self.post(HTTP_X_API_KEY="test-key", HTTP_X_SIGNATURE="0" * 64).status_code, 401
+        )
+        record_event.assert_called_once()
+
+    def test_malformed_body(self, record_event):
+        self.assertEqual(self.post(b"{not json", HTTP_X_API_KEY="test-key").status_code, 400)
+        self.assertEqual(self.post(b"[]", HTTP_X_API_KEY="test-key").status_code, 400)
+        record_event.assert_not_called()
+
+    def test_dispatcher_routes_webhooks_to_the_webhook_urlconf(self, record_event):
+        application = mock.Mock(return_value=[b"page"])
+        dispatcher = WebhookDispatcher(application)
+        statuses = []
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        environ = RequestFactory().post(
+            "/topic/ping/", self.body, content_type="application/json", HTTP_X_API_KEY="test-key"
+        ).environ
+        dispatcher(environ, start_response).close()
+        self.assertEqual(statuses, ["200 OK"])
+        record_event.assert_called_once_with("ping", {"comment": "test"}, None)
+        application.assert_not_called()
+
+        dispatcher(RequestFactory().get("/").environ, start_response)
+        application.assert_called_once()
+
+    @override_settings(PROFILER_PATHS=[r"^/topic/"], PROFILER_INTERVAL=0.001)
+    def test_webhooks_are_profiled(self, record_event):
+        profile_store.clear()
+        self.addCleanup(profile_store.clear)
+        environ = RequestFactory().post(
+            "/topic/ping/", self.body, content_type="application/json", HTTP_X_API_KEY="test-key"
+        ).environ
+        with mock.patch.dict(WEBHOOK_HANDLERS, ping=lambda body, wallet_id: time.sleep(0.05)):
+            WebhookWSGIHandler()(environ, lambda status, headers: None).close()
+        self.assertIn("webhook_ping", profile_store.collapsed())
+
+
+class TractionAPITests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_traction_stub()
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        self.client = TractionAPI("key", "tenant", base_url=get_stub_url(self.server))
+        self.addCleanup(self.client.close)
+
+    def test_error_status_raises(self):
+        with self.assertRaises(TractionAPIError) as raised:
+            self.client.send_traction_request("/unknown", method="GET")
+        self.assertEqual(raised.exception.status_code, 404)
+
+    def test_success(self):
+        self.assertEqual(
+            self.client.send_traction_request("/status", method="GET"), {"status": "ok"}
+        )
+
+    def test_iter_records_pages(self):
+        server = start_traction_stub(list_size=25)
+        self.addCleanup(server.shutdown)
+        client = TractionAPI("key", "tenant", base_url=get_stub_url(server))
+        self.addCleanup(client.close)
+        records = list(client.iter_connections(page_size=10))
+        self.assertEqual(
+            [record["record_id"] for record in records],
+            [f"/connections/{index}" for index in range(25)],
+        )
+
+    def test_iter_records_stops_when_paging_is_ignored(self):
+        page = [{"record_id": index} for index in range(10)]
+        with mock.patch.object(
+            self.client, "send_traction_request", return_value={"results": page}
+        ) as send:
+            self.assertEqual(list(self.client.iter_connections(page_size=10)), page)
+        self.assertEqual(send.call_count, 2)
+
+        # Everything returned at once, more than a page
+        records = [{"record_id": index} for index in range(15)]
+        with mock.patch.object(
+            self.client, "send_traction_request", return_value={"results": records}
+        ) as send:
+            self.assertEqual(list(self.client.iter_connections(page_size=10)), records)
+        self.assertEqual(send.call_count, 1)
+
+
+@override_settings(**TRACTION_SETTINGS)
+class RevokeCredentialsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = user = User.objects.create(username="student")
+        self.flows = [
+            ConnectionState.objects.create(
+                user=user,
+                connection_id=f"conn-{index}",
+                revocation_registry_id="rev-reg",
+                revocation_id=str(index),
+                presentation_exchange_id="",
+                state=StateModelEnum.CREDENTIAL_ISSUED.value,
+            )
+            for index in range(3)
+        ]
+
+    def revoke(self, client):
+        with mock.patch("student.services.get_traction_client", return_value=client):
+            return revoke_credentials(ConnectionState.objects.all(), batch_size=2)
+
+    def states(self):
+        return list(ConnectionState.objects.order_by("pk").values_list("state", flat=True))
+
+    def test_revoked_after_publish(self):
+        client = FakeTractionClient()
+        self.assertEqual(self.revoke(client), (3, 0))
+        self.assertEqual(self.states(), [StateModelEnum.REVOKED.value] * 3)
+        self.assertEqual(client.calls[-1][0], "/revocation/publish-revocations")
+
+    def test_failed_revocation_left_issued(self):
+        client = FakeTractionClient()
+        send = client.send_traction_request
+
+        def send_traction_request(endpoint, body={}, **kwargs):
+            if body.get("cred_rev_id") == "1":
+                raise TractionAPIError("already revoked", status_code=400)
+            return send(endpoint, body, **kwargs)
+
+        client.send_traction_request = send_traction_request
+        self.assertEqual(self.revoke(client), (2, 1))
+        self.assertEqual(
+            self.states(),
+            [
+                StateModelEnum.REVOKED.value,
+                StateModelEnum.CREDENTIAL_ISSUED.value,
+                StateModelEnum.REVOKED.value,
+            ],
+        )
+
+    def test_failed_publish_leaves_flows_issued(self):
+        client = FakeTractionClient(failing={"/revocation/publish-revocations"})
+        self.assertEqual(self.revoke(client), (0, 3))
+        self.assertEqual(self.states(), [StateModelEnum.CREDENTIAL_ISSUED.value] * 3)
+
+    def test_revoked_credential_verifications_are_not_reused(self):
+        cred_def_id = TRACTION_SETTINGS["TRACTION_CREDENTIAL_DEFINITION_ID"]
+        verification = VerifiedPresentation.objects.create(
+            user=self.user,
+            proof_template="proof-request",
+            cred_def_id=cred_def_id,
+            presentation_exchange_id="pres",
+        )
+        other = VerifiedPresentation.objects.create(
+            user=self.user,
+            proof_template="proof-request",
+            cred_def_id="other:3:CL:1:student",
+            presentation_exchange_id="other-pres",
+        )
+        # Cached by the check
+        self.assertEqual(get_recent_verification(self.user, cred_def_id), verification)
+
+        self.revoke(FakeTractionClient())
+        self.assertIsNone(get_recent_verification(self.user, cred_def_id))
+        self.assertEqual(list(VerifiedPresentation.objects.all()), [other])
+
+
+@override_settings(**TRACTION_SETTINGS)
+class FlowTestCase(TestCase):
+    """Logged-in student talking to a fake Traction tenant"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="student")
+        self.client.force_login(self.user)
+        self.traction = FakeTractionClient({"/connections/create-invitation": INVITATION})
+        for target in (
+            "student.views.get_traction_client",
+            "student.services.get_traction_client",
+            "student.management.commands.reconcile.get_traction_client",
+        ):
+            patcher = mock.patch(target, return_value=self.traction)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_flow(self, **fields):
+        return ConnectionState.objects.create(
+            **{
+                "user": self.user,
+                "connection_id": "conn",
+                "revocation_registry_id": "",
+                "revocation_id": "",
+                "presentation_exchange_id": "",
+                "state": StateModelEnum.CONNECTION_INVITATION.value,
+                "tenant_id": "t1",
+                "connection_state": "active",
+                **fields,
+            }
+        )
+
+
+class IssueCredentialViewTests(FlowTestCase):
+    def test_offer_over_active_connection(self):
+        flow = self.create_flow()
+        response = self.client.get(reverse("student:issue-badge"))
+        self.assertTrue(response.context["offer_sent"])
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.OFFER_SENT.value)
+
+    def test_rejected_offer_falls_back_to_invitation(self):
+        flow = self.create_flow()
+        self.traction.failing.add("/issue-credential/send-offer")
+        response = self.client.get(reverse("student:issue-badge"))
+        self.assertEqual(response.context["connection_id"], "new-conn")
+        self.assertIn("qr_code_img", response.context)
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.CONNECTION_INVITATION.value)
+
+    def test_issued_credential_invalidates_active_connection(self):
+        self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.client.get(reverse("student:issue-badge"))
+        handle_issue_credential_event(
+            {"connection_id": "conn", "state": "request_received", "credential_exchange_id": "x"},
+            "wallet-1",
+        )
+        # A new offer is sent instead of re-rendering the cached "offer sent" state
+        self.traction.calls.clear()
+        self.client.get(reverse("student:issue-badge"))
+        self.assertIn("/issue-credential/send-offer", [call[0] for call in self.traction.calls])
+
+    def test_expired_flow_invalidates_active_connection(self):
+        self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.client.get(reverse("student:issue-badge"))
+        self.assertEqual(self.traction.calls, [])
+
+        self.assertEqual(expire_flows(ConnectionState.objects.all()), 1)
+        # The expired flow is offered again instead of the cached "offer sent" state
+        self.client.get(reverse("student:issue-badge"))
+        self.assertIn("/issue-credential/send-offer", [call[0] for call in self.traction.calls])
+
+
+@override_settings(**TRACTION_SETTINGS)
+class EventLogTests(SimpleTestCase):
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log = os.path.join(log_dir.name, "events.log")
+
+    def write(self, path, *timestamps):
+        with open(path, "w") as f:
+            for ts in timestamps:
+                f.write(json.dumps({"ts": ts, "topic": "ping", "body": {}}) + "\n")
+
+    def test_each_process_writes_its_own_log(self):
+        with override_settings(WEBHOOK_EVENT_LOG=self.log):
+            record_event("ping", {})
+            # Stops the writer thread once the queued event is written
+            _flush_at_exit()
+        self.assertEqual(get_log_files(self.log), [get_process_log_path(self.log)])
+        self.assertEqual(get_process_log_path(self.log, 42), self.log[:-4] + ".42.log")
+
+    def test_process_logs_are_merged_by_timestamp(self):
+        with gzip.open(get_process_log_path(self.log, 1) + ".1.gz", "wt") as f:
+            f.write(json.dumps({"ts": 1, "topic": "ping", "body": {}}) + "\n")
+        self.write(get_process_log_path(self.log, 1), 4)
+        self.write(get_process_log_path(self.log, 2), 2, 3, 5)
+        files = get_log_files(self.log)
+        self.assertEqual(len(files), 3)
+        self.assertEqual([event["ts"] for event in iter_events(files)], [1, 2, 3, 4, 5])
+
+
+class ReplayEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="student")
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log = os.path.join(log_dir.name, "events.log")
+        with open(self.log, "w") as f:
+            event = {
+                "connection_id": "conn",
+                "state": "request_received",
+                "credential_exchange_id": "cred",
+            }
+            f.write(
+                json.dumps(
+                    {"ts": 0, "topic": "issue_credential", "wallet_id": "wallet-2", "body": event}
+                )
+            )
+
+    def test_requires_an_explicit_target(self):
+        with self.assertRaises(CommandError):
+            call_command("replay_events", self.log, stdout=io.StringIO())
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command("replay_events", self.log, "--dry-run", stdout=out)
+        self.assertIn("1 events", out.getvalue())
+
+    @override_settings(
+        TRACTION_TENANTS={
+            "t2": {"api_key": "key2", "wallet_id": "wallet-2", "base_url": "http://t2.invalid"}
+        }
+    )
+    def test_traction_url_overrides_tenant_base_url(self):
+        server = start_traction_stub()
+        self.addCleanup(server.shutdown)
+        flow = ConnectionState.objects.create(
+            user=self.user,
+            connection_id="conn",
+            revocation_registry_id="",
+            revocation_id="",
+            presentation_exchange_id="",
+            state=StateModelEnum.OFFER_SENT.value,
+            tenant_id="t2",
+        )
+
+        out = io.StringIO()
+        call_command(
+            "replay_events", self.log, "--traction-url", get_stub_url(server), stdout=out, stderr=out
+        )
+
+        self.assertIn("0 failed", out.getvalue())
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.CREDENTIAL_ISSUED.value)
+
+
+@override_settings(
+    **TRACTION_SETTINGS,
+    TRACTION_CLIENT_REGISTRY_SIZE=1,
+    TRACTION_CLIENT_IDLE_TIMEOUT=900,
+)
+class TractionClientRegistryTests(SimpleTestCase):
+    def setUp(self):
+        TractionDjangoClient.reset_client()
+        self.addCleanup(TractionDjangoClient.reset_client)
+
+    @override_settings(TRACTION_TENANTS={"t2": {"api_key": "key2"}})
+    def test_evicted_client_is_not_closed_while_in_use(self):
+        client = TractionDjangoClient.get_client("t1")
+        with mock.patch("requests.adapters.HTTPAdapter.close") as close:
+            TractionDjangoClient.get_client("t2")
+            self.assertNotIn("t1", TractionDjangoClient._clients)
+            close.assert_not_called()
+
+            # Closed once the last user lets go of it
+            del client
+            gc.collect()
+            close.assert_called()
+
+    def test_idle_client_is_not_closed_while_in_use(self):
+        client = TractionDjangoClient.get_client("t1")
+        with mock.patch("requests.adapters.HTTPAdapter.close") as close, mock.patch(
+            "student.traction_django.time.monotonic", return_value=time.monotonic() + 1000
+        ):
+            self.assertIsNot(TractionDjangoClient.get_client("t1"), client)
+            close.assert_not_called()
+
+
+LIMITS = {"send-offer": {"user": {"burst": 2, "refill": 0}, "global": {"burst": 3, "refill": 0}}}
+
+
+@override_settings(TRACTION_RATE_LIMITS=LIMITS)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob = User(pk=1), User(pk=2)
+
+    def test_bucket_burst_and_refill(self):
+        bucket = TokenBucket("test-bucket", burst=2, refill_rate=1)
+        with mock.patch("student.ratelimit.time.time", return_value=1000.0):
+            self.assertTrue(bucket.consume())
+            self.assertTrue(bucket.consume())
+            self.assertFalse(bucket.consume())
+        with mock.patch("student.ratelimit.time.time", return_value=1001.0):
+            self.assertTrue(bucket.consume())
+            self.assertFalse(bucket.consume())
+
+    def test_user_bucket(self):
+        self.assertTrue(allow_request("send-offer", self.alice))
+        self.assertTrue(allow_request("send-offer", self.alice))
+        self.assertFalse(allow_request("send-offer", self.alice))
+        self.assertTrue(allow_request("send-offer", self.bob))
+        self.assertEqual(get_counters()["send-offer"], {"allowed": 3, "shed": 1})
+
+    def test_shed_request_takes_no_token(self):
+        for user in (self.alice, self.bob, self.bob):
+            self.assertTrue(allow_request("send-offer", user))
+        # Shed by the global bucket: alice's bucket keeps its last token
+        self.assertFalse(allow_request("send-offer", self.alice))
+        self.assertAlmostEqual(
+            TokenBucket("ratelimit_bucket_send-offer_user_1", 2, 0).available(time.time()), 1
+        )
+        # Shed by alice's empty bucket: the global bucket keeps its tokens
+        cache.delete("ratelimit_bucket_send-offer_global")
+        self.assertTrue(allow_request("send-offer", self.alice))
+        self.assertFalse(allow_request("send-offer", self.alice))
+        self.assertAlmostEqual(
+            TokenBucket("ratelimit_bucket_send-offer_global", 3, 0).available(time.time()), 2
+        )
+
+    def test_unlimited_endpoint(self):
+        self.assertTrue(all(allow_request("create-invitation", self.alice) for _ in range(10)))
+
+
+class ProfileHotspotsTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create(username="admin", is_staff=True))
+
+    def test_limit(self):
+        url = reverse("student:profile-hotspots")
+        self.assertEqual(self.client.get(url, {"limit": "5"}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"limit": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": "-1"}).status_code, 400)
+
+
+class IssueCredentialEventTests(FlowTestCase):
+    def event(self, state, **fields):
+        handle_issue_credential_event(
+            {"connection_id": "conn", "state": state, "credential_exchange_id": "cred", **fields},
+            "wallet-1",
+        )
+
+    def test_auto_issued_credential_without_request_received(self):
+        flow = self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.event("credential_acked", revocation_registry_id="rev-reg", revocation_id="7")
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.CREDENTIAL_ISSUED.value)
+        self.assertEqual((flow.revocation_registry_id, flow.revocation_id), ("rev-reg", "7"))
+        self.assertEqual(self.traction.calls, [])
+
+    def test_manual_issue_on_request_received(self):
+        flow = self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.event("request_received")
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.CREDENTIAL_ISSUED.value)
+        self.assertEqual(self.traction.calls[0][0], "/issue-credential/records/cred/issue")
+        self.assertIsNone(flow.issued_at)
+
+    def test_issued_at_set_once_issued(self):
+        flow = self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.event("request_received")
+        self.event("credential_issued")
+        flow.refresh_from_db()
+        issued_at = flow.issued_at
+        self.assertIsNotNone(issued_at)
+        self.event("credential_acked")
+        flow.refresh_from_db()
+        self.assertEqual(flow.issued_at, issued_at)
+
+    def test_new_offer_on_issued_connection_keeps_the_issued_flow(self):
+        flow = self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.event("credential_acked", revocation_registry_id="rev-reg", revocation_id="1")
+        cache.clear()
+        self.client.get(reverse("student:issue-badge"))
+        self.event("credential_acked", revocation_registry_id="rev-reg", revocation_id="2")
+
+        flow.refresh_from_db()
+        self.assertEqual(flow.revocation_id, "1")
+        offer = ConnectionState.objects.latest("pk")
+        self.assertNotEqual(offer.pk, flow.pk)
+        self.assertEqual(offer.state, StateModelEnum.CREDENTIAL_ISSUED.value)
+        self.assertEqual((offer.connection_id, offer.tenant_id), ("conn", "t1"))
+        self.assertEqual(offer.revocation_id, "2")
+
+    def test_resent_offer_restarts_the_issued_stage(self):
+        flow = self.create_flow(
+            state=StateModelEnum.OFFER_SENT.value,
+            offer_sent_at=timezone.now() - datetime.timedelta(days=1),
+            issued_at=timezone.now() - datetime.timedelta(days=1),
+        )
+        send_credential_offers(ConnectionState.objects.all())
+        self.event("credential_acked")
+        flow.refresh_from_db()
+        self.assertGreaterEqual(flow.issued_at, flow.offer_sent_at)
+
+    def test_stage_stats_skip_negative_durations(self):
+        now = timezone.now()
+        self.create_flow(offer_sent_at=now, issued_at=now + datetime.timedelta(seconds=5))
+        self.create_flow(offer_sent_at=now, issued_at=now - datetime.timedelta(hours=1))
+        count, percentiles = stage_stats(
+            ConnectionState.objects.all(), "offer_sent_at", "issued_at"
+        )
+        self.assertEqual(count, 1)
+        self.assertEqual(percentiles[50], datetime.timedelta(seconds=5))
+
+    def test_reconcile_applies_issued_record(self):
+        flow = self.create_flow(state=StateModelEnum.OFFER_SENT.value)
+        self.traction.iter_credential_records = lambda connection_id: [
+            {"connection_id": "conn", "state": "credential_issued", "updated_at": "2"},
+        ]
+        call_command("reconcile", "--stale-after", "0", stdout=io.StringIO())
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.CREDENTIAL_ISSUED.value)
+
+    def test_reconcile_only_applies_the_flow_exchange(self):
+        self.traction.responses["/issue-credential/send-offer"] = {
+            "credential_exchange_id": "cred-2"
+        }
+        flow = self.create_flow()
+        self.assertEqual(send_credential_offers(ConnectionState.objects.all()), (1, 0))
+        flow.refresh_from_db()
+        self.assertEqual(flow.credential_exchange_id, "cred-2")
+
+        # The connection's earlier, acked exchange must not issue the new offer
+        self.traction.iter_credential_records = lambda connection_id: [
+            {"connection_id": "conn", "state": "credential_acked", "updated_at": "1"},
+        ]
+        self.traction.responses["/issue-credential/records/cred-2"] = {
+            "connection_id": "conn",
+            "state": "offer_sent",
+            "credential_exchange_id": "cred-2",
+        }
+        call_command("reconcile", "--stale-after", "0", stdout=io.StringIO())
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.OFFER_SENT.value)
+        self.assertEqual(self.traction.calls[-1][0], "/issue-credential/records/cred-2")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportStudentsTests(TestCase):
+    def import_csv(self, rows, *args, header="username,password,course"):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write(f"{header}\n")
+            csv_file.writelines(f"{row}\n" for row in rows)
+        self.addCleanup(os.remove, csv_file.name)
+        out = io.StringIO()
+        call_command("import_students", csv_file.name, "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_duplicates_in_adjacent_chunks(self):
+        out = self.import_csv(
+            ["alice,pw,math", "bob,pw,math", "alice,pw,law"], "--chunk-size", "2"
+        )
+        self.assertIn("2 students imported, 1 skipped", out)
+        self.assertEqual(Student.objects.get(user__username="alice").course, "math")
+
+    def test_existing_users_skipped(self):
+        User.objects.create(username="alice")
+        out = self.import_csv(["alice,pw,math", "bob,pw,math"])
+        self.assertIn("1 students imported, 1 skipped", out)
+
+    def test_rows_without_username_or_password_rejected(self):
+        out = self.import_csv([",pw,math", "  ,pw,math", "carol,,math", "dave,pw,math"])
+        self.assertIn("1 students imported, 0 skipped, 3 invalid", out)
+        self.assertEqual(list(User.objects.values_list("username", flat=True)), ["dave"])
+        self.assertTrue(User.objects.get(username="dave").check_password("pw"))
+
+    @override_settings(
+        **TRACTION_SETTINGS
+        | {"TRACTION_TENANTS": {"t2": {"api_key": "k2", "departments": ["Math"]}}}
+    )
+    def test_invitations_created_per_chunk_on_the_department_tenant(self):
+        def get_client(tenant_id):
+            return FakeTractionClient(
+                {
+                    "/connections/create-invitation": {
+                        "connection_id": f"conn-{tenant_id}",
+                        "invitation_url": f"https://{tenant_id}.invalid",
+                    }
+                }
+            )
+
+        output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(output_dir.cleanup)
+        output = os.path.join(output_dir.name, "invitations.csv")
+        with mock.patch(
+            "student.management.commands.import_students.get_traction_client", get_client
+        ), mock.patch(
+            "student.management.commands.import_students.Command.write_invitations",
+            autospec=True,
+            side_effect=ImportStudentsCommand.write_invitations,
+        ) as write_invitations:
+            out = self.import_csv(
+                ["alice,pw,Math", "bob,pw,Law"],
+                "--chunk-size",
+                "1",
+                "--create-invitations",
+                output,
+                header="username,password,department",
+            )
+
+        self.assertIn("2 invitations created, 0 failed", out)
+        self.assertEqual([len(call.args[1]) for call in write_invitations.call_args_list], [1, 1])
+        self.assertEqual(
+            dict(ConnectionState.objects.values_list("user__username", "tenant_id")),
+            {"alice": "t2", "bob": "t1"},
+        )
+        with open(output) as f:
+            self.assertEqual(
+                f.read().splitlines(),
+                ["username,invitation_url", "alice,https://t2.invalid", "bob,https://t1.invalid"],
+            )
+
+
+@override_settings(CREDENTIAL_VALIDITY_DAYS=30)
+class CredentialOfferSnapshotTests(FlowTestCase):
+    stale = {"given_name": "Old", "family_name": "Name", "expires": "20000101"}
+
+    def offered_attributes(self):
+        endpoint, body = self.traction.calls[-1]
+        self.assertEqual(endpoint, "/issue-credential/send-offer")
+        return {
+            attribute["name"]: attribute["value"]
+            for attribute in body["credential_preview"]["attributes"]
+        }
+
+    def test_new_offer_on_reused_connection_takes_a_new_snapshot(self):
+        self.user.first_name = "New"
+        self.user.save()
+        flow = self.create_flow(
+            state=StateModelEnum.CREDENTIAL_ISSUED.value, credential_attributes=self.stale
+        )
+        self.client.get(reverse("student:issue-badge"))
+
+        attributes = self.offered_attributes()
+        self.assertEqual(attributes["given_name"], "New")
+        self.assertEqual(attributes["expires"], credential_expiry())
+        offer = ConnectionState.objects.latest("pk")
+        self.assertNotEqual(offer.pk, flow.pk)
+        self.assertEqual(offer.credential_attributes["expires"], credential_expiry())
+
+    def test_resent_offers_carry_a_current_expiry(self):
+        self.create_flow(credential_attributes=self.stale)
+        self.assertEqual(send_credential_offers(ConnectionState.objects.all()), (1, 0))
+        attributes = self.offered_attributes()
+        self.assertEqual(attributes["given_name"], "Old")
+        self.assertEqual(attributes["expires"], credential_expiry())
+
+
+class VerificationReuseTests(FlowTestCase):
+    cred_def_id = TRACTION_SETTINGS["TRACTION_CREDENTIAL_DEFINITION_ID"]
+
+    def verify(self, cred_def_id):
+        # Written directly, not by record_verification(): drop the cached lookups
+        cache.clear()
+        return VerifiedPresentation.objects.create(
+            user=self.user,
+            proof_template="proof-request",
+            cred_def_id=cred_def_id,
+            presentation_exchange_id=f"pres-{cred_def_id}",
+        )
+
+    def test_reuse_matches_the_tenant_credential_definition(self):
+        self.verify("other:3:CL:1:student")
+        self.assertIsNone(get_recent_verification(self.user, self.cred_def_id))
+        verification = self.verify(self.cred_def_id)
+        self.assertEqual(get_recent_verification(self.user, self.cred_def_id), verification)
+
+    def test_presentation_request_reuses_the_tenant_verification(self):
+        self.create_flow()
+        self.verify("other:3:CL:1:student")
+        self.client.post(reverse("student:presentation-request"))
+        self.assertEqual(self.traction.calls[-1][0], "/present-proof/send-request")
+
+        self.traction.calls.clear()
+        self.verify(self.cred_def_id)
+        response = self.client.post(reverse("student:presentation-request"))
+        self.assertEqual(response.context["verification"].cred_def_id, self.cred_def_id)
+        self.assertEqual(self.traction.calls, [])
+
+
+class FlowTokenTests(FlowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flow = self.create_flow(connection_id="token-conn")
+        self.token = make_flow_token(self.flow)
+
+    def test_round_trip(self):
+        self.assertEqual(get_flow_for_token(self.token, self.user), self.flow)
+        self.assertEqual(get_flow_for_token(self.token, self.user).connection_id, "token-conn")
+
+    def test_rejected_tokens(self):
+        other = User.objects.create(username="other")
+        self.assertIsNone(get_flow_for_token("", self.user))
+        self.assertIsNone(get_flow_for_token(self.token + "x", self.user))
+        self.assertIsNone(get_flow_for_token(self.token, other))
+        # Signed with another key
+        with self.settings(SECRET_KEY="another-key"):
+            forged = make_flow_token(self.flow)
+        self.assertIsNone(get_flow_for_token(forged, self.user))
+
+    @override_settings(FLOW_TOKEN_MAX_AGE=60)
+    def test_expired_token(self):
+        with mock.patch("django.core.signing.time.time", return_value=time.time() + 120):
+            self.assertIsNone(read_flow_token(self.token, self.user))
+
+    def test_token_for_a_flow_the_user_no_longer_owns(self):
+        # A validly signed token naming another user's flow
+        other_flow = self.create_flow(user=User.objects.create(username="other"))
+        token = signing.dumps(
+            {"id": other_flow.pk, "user": self.user.pk, "connection_id": "x", "tenant_id": "t1"},
+            salt=FLOW_TOKEN_SALT,
+            compress=True,
+        )
+        self.assertIsNotNone(read_flow_token(token, self.user))
+        self.assertIsNone(get_flow_for_token(token, self.user))
+
+    def test_presentation_request_uses_the_token_flow(self):
+        self.create_flow(connection_id="latest-conn")
+        self.client.post(reverse("student:presentation-request"), {"flow_token": self.token})
+        endpoint, body = self.traction.calls[-1]
+        self.assertEqual(endpoint, "/present-proof/send-request")
+        self.assertEqual(body["connection_id"], "token-conn")
+
+    def test_invitation_page_links_the_flow(self):
+        self.flow.delete()
+        response = self.client.get(reverse("student:issue-badge"))
+        self.assertIn("qr_code_img", response.context)
+        flow_token = response.context["flow_token"]
+        self.assertEqual(
+            get_flow_for_token(flow_token, self.user).connection_id, INVITATION["connection_id"]
+        )
+        self.assertContains(response, f"?flow={quote(flow_token)}")
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+class SignedCookieSessionTests(TestCase):
+    def test_login_without_session_rows(self):
+        user = User.objects.create(username="student")
+        user.set_password("secret")
+        user.save()
+
+        response = self.client.post(
+            reverse("login"), {"username": "student", "password": "secret"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get(reverse("student:home")).status_code, 200)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_forged_session_cookie_is_rejected(self):
+        user = User.objects.create(username="student")
+        self.client.force_login(user)
+        with self.settings(SECRET_KEY="another-key"):
+            forged = signing.dumps(
+                dict(self.client.session.items()),
+                salt="django.contrib.sessions.backends.signed_cookies",
+                serializer=signing.JSONSerializer,
+                compress=True,
+            )
+        self.client.cookies["sessionid"] = forged
+        response = self.client.get(reverse("student:home"))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(TRACTION_TENANTS={"t2": {"api_key": "key2", "wallet_id": "wallet-2"}})
+class WebhookRoutingTests(FlowTestCase):
+    def test_wallet_id_is_mapped_to_its_tenant(self):
+        # Created first: an unscoped lookup would pick it
+        other = self.create_flow(connection_state="invitation", tenant_id="t2")
+        flow = self.create_flow(connection_state="invitation")
+
+        handle_connections_event({"connection_id": "conn", "state": "active"}, "wallet-1")
+
+        flow.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(flow.connection_state, "active")
+        self.assertEqual(flow.state, StateModelEnum.OFFER_SENT.value)
+        self.assertEqual(other.connection_state, "invitation")
+        self.assertEqual(self.traction.calls[-1][0], "/issue-credential/send-offer")
+
+    def test_unconfigured_wallet_matches_by_connection(self):
+        flow = self.create_flow(connection_state="invitation")
+        handle_connections_event({"connection_id": "conn", "state": "active"}, "wallet-uuid")
+        flow.refresh_from_db()
+        self.assertEqual(flow.state, StateModelEnum.OFFER_SENT.value)
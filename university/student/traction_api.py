@@ -7,7 +7,10 @@ opportunity tracking, and reporting.
 """
 
 import requests
-from typing import Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,14 +34,17 @@ class TractionAPI:
         tenant_id: str = None,
         base_url: str = "https://api.traction.io/v1",
         timeout: int = 30,
+        token_ttl: int = 3000,
     ):
         """
         Initialize a new TractionAPI client
 
         Args:
             api_key: API key for authentication
+            tenant_id: Traction tenant the client acts for
             base_url: Base URL for the Traction API (optional)
             timeout: Request timeout in seconds (optional)
+            token_ttl: Seconds a tenant token is reused before re-authenticating (optional)
         """
         if not api_key:
             raise ValueError("API key is required")
@@ -47,6 +53,12 @@ class TractionAPI:
         self.base_url = base_url
         self.timeout = timeout
         self.tenant_id = tenant_id
+        self.token_ttl = token_ttl
+        # Each client keeps its own connection pool and token
+        self.session = requests.Session()
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -61,7 +73,9 @@ class TractionAPI:
             str: Authentication token
         """
         url = f"{self.base_url}/multitenancy/tenant/{self.tenant_id}/token"
-        response = requests.post(url, json={"api_key": self.api_key})
+        response = self.session.post(
+            url, json={"api_key": self.api_key}, timeout=self.timeout
+        )
         if response.status_code != 200:
             logger.error(f"Authentication failed: {response.text}")
             raise TractionAPIError(
@@ -81,6 +95,28 @@ class TractionAPI:
         logger.info("Authentication successful")
         return token
 
+    def get_token(self) -> str:
+        """
+        Return the cached tenant token, authenticating when it is missing or expired
+
+        Returns:
+            str: Authentication token
+        """
+        with self._token_lock:
+            if self._token is None or time.monotonic() >= self._token_expires_at:
+                self._token = self.authenticate()
+                self._token_expires_at = time.monotonic() + self.token_ttl
+            return self._token
+
+    def invalidate_token(self):
+        """Drop the cached token so the next request authenticates again"""
+        with self._token_lock:
+            self._token = None
+
+    def close(self):
+        """Close the pooled HTTP connections of this client"""
+        self.session.close()
+
     def _request(
         self,
         method: str,
@@ -106,17 +142,17 @@ class TractionAPI:
         url = f"{self.base_url}{endpoint}"
 
         try:
-            response = requests.request(
+            # The body is read eagerly; closing hands the connection back to the pool
+            with self.session.request(
                 method=method,
                 url=url,
                 headers=self.headers,
                 json=data if data else None,
                 params=params,
                 timeout=self.timeout,
-            )
-
-            response.raise_for_status()
-            return response.json()
+            ) as response:
+                response.raise_for_status()
+                return response.json()
 
         except requests.exceptions.HTTPError as e:
             error_data = None
@@ -151,6 +187,7 @@ class TractionAPI:
         endpoint: str,
         body: Dict = {},
         params: Dict = None,
+        method: str = "POST",
     ) -> Dict:
         """
         Send a request to the Traction API
@@ -159,15 +196,19 @@ class TractionAPI:
             endpoint: API endpoint
             body: Request body
             params: Query parameters
+            method: HTTP method (optional, POST by default)
 
         Returns:
             Response data
+
+        Raises:
+            TractionAPIError: If the request fails or Traction answers with an error status
         """
         logger.info("Sending request to Traction API.")
         if not endpoint:
             raise ValueError("Endpoint is required")
 
-        if not body:
+        if not body and method == "POST":
             logger.warning("Request body is empty")
 
         if not params:
@@ -176,18 +217,177 @@ class TractionAPI:
         url = f"{self.base_url}{endpoint}"
 
         logger.debug(f"Request URL: {url}")
-        token = (
-            self.authenticate()
-        )  # Token pode ser utilizado em mais de uma requisição?? #TODO Testar
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        }
+        for attempt in range(2):
+            headers = {
+                "Authorization": f"Bearer {self.get_token()}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
 
-        response = requests.post(url, json=body, params=params, headers=headers)
+            try:
+                response = self.session.request(
+                    method,
+                    url,
+                    json=body if method == "POST" else None,
+                    params=params,
+                    headers=headers,
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.RequestException as e:
+                raise TractionAPIError(message=str(e))
+            # The cached token may have been revoked or expired early
+            if response.status_code != 401 or attempt:
+                break
+            self.invalidate_token()
 
         logger.debug(f"Response status code: {response.status_code}")
         logger.debug(f"Response body: {response.text}")
+
+        if not response.ok:
+            error_data = None
+            try:
+                error_data = response.json()
+            except ValueError:
+                error_data = {"error": response.text}
+
+            raise TractionAPIError(
+                message=f"Request to {endpoint} failed with status {response.status_code}",
+                status_code=response.status_code,
+                data=error_data,
+            )
         return response.json()
+
+    # Paginated list iterators
+
+    def iter_records(
+        self,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        page_size: int = 100,
+    ) -> Iterator[Dict]:
+        """
+        Lazily iterate over the records of a paginated Traction list endpoint
+
+        Pages are requested with limit/offset; the next page is fetched in the
+        background while the current one is consumed, so at most two pages
+        are held in memory. Closing the iterator early stops the paging.
+        Paging stops at the first page that is not exactly page_size records
+        long, or that repeats the previous one (an endpoint ignoring
+        limit/offset), so it always terminates.
+
+        Args:
+            endpoint: List endpoint (e.g. /connections)
+            params: Filters as query parameters; None values are dropped
+            page_size: Records requested per page
+
+        Yields:
+            Dict: One record at a time
+
+        Raises:
+            TractionAPIError: If a page is not a list response
+        """
+        filters = {key: value for key, value in (params or {}).items() if value is not None}
+
+        def fetch_page(offset):
+            data = self.send_traction_request(
+                endpoint,
+                params={**filters, "limit": page_size, "offset": offset},
+                method="GET",
+            )
+            if "results" not in data:
+                raise TractionAPIError(
+                    message=f"Unexpected list response from {endpoint}", data=data
+                )
+            return data["results"]
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            offset = 0
+            previous_bounds = None
+            next_page = executor.submit(fetch_page, offset)
+            while next_page is not None:
+                page = next_page.result()
+                bounds = (page[0], page[-1]) if page else None
+                if bounds is not None and bounds == previous_bounds:
+                    # Same records for a new offset: paging is being ignored
+                    break
+                offset += page_size
+                # A short (or oversized, unpaginated) page is the last one
+                next_page = (
+                    executor.submit(fetch_page, offset)
+                    if len(page) == page_size
+                    else None
+                )
+                previous_bounds = bounds
+                yield from page
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_connections(
+        self, state: Optional[str] = None, page_size: int = 100, **filters
+    ) -> Iterator[Dict]:
+        """
+        Iterate over connection records
+
+        Args:
+            state: Connection state filter (e.g. active) (optional)
+            page_size: Records requested per page (optional)
+            **filters: Other /connections filters (alias, their_role, ...)
+
+        Yields:
+            Dict: Connection records
+        """
+        return self.iter_records(
+            "/connections", {"state": state, **filters}, page_size
+        )
+
+    def iter_credential_records(
+        self,
+        connection_id: Optional[str] = None,
+        state: Optional[str] = None,
+        page_size: int = 100,
+        **filters,
+    ) -> Iterator[Dict]:
+        """
+        Iterate over credential exchange records
+
+        Args:
+            connection_id: Connection filter (optional)
+            state: Exchange state filter (e.g. credential_acked) (optional)
+            page_size: Records requested per page (optional)
+            **filters: Other /issue-credential/records filters (role, thread_id)
+
+        Yields:
+            Dict: Credential exchange records
+        """
+        return self.iter_records(
+            "/issue-credential/records",
+            {"connection_id": connection_id, "state": state, **filters},
+            page_size,
+        )
+
+    def iter_presentation_records(
+        self,
+        connection_id: Optional[str] = None,
+        state: Optional[str] = None,
+        page_size: int = 100,
+        **filters,
+    ) -> Iterator[Dict]:
+        """
+        Iterate over presentation exchange records
+
+        Args:
+            connection_id: Connection filter (optional)
+            state: Exchange state filter (e.g. verified) (optional)
+            page_size: Records requested per page (optional)
+            **filters: Other /present-proof/records filters (role, thread_id)
+
+        Yields:
+            Dict: Presentation exchange records
+        """
+        return self.iter_records(
+            "/present-proof/records",
+            {"connection_id": connection_id, "state": state, **filters},
+            page_size,
+        )
@@ -3,60 +3,231 @@ Django integration for the TractionAPI library.
 This file provides utilities for using TractionAPI within a Django application.
 """
 
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
 from django.conf import settings
 from django.core.cache import cache
 
-from .traction_api import TractionAPI
+
+def get_default_tenant_id():
+    """
+    Return the tenant used when none is given
+
+    Returns:
+        str: TRACTION_TENANT_ID, or the first tenant of TRACTION_TENANTS
+    """
+    tenant_id = getattr(settings, "TRACTION_TENANT_ID", None)
+    if not tenant_id:
+        tenant_id = next(iter(getattr(settings, "TRACTION_TENANTS", {})), None)
+    if not tenant_id:
+        raise ValueError("TRACTION_TENANT_ID is required in Django settings")
+    return tenant_id
+
+
+def get_tenant_config(tenant_id=None):
+    """
+    Resolve the configuration of a Traction tenant
+
+    Entries of TRACTION_TENANTS override the global TRACTION_* settings, which
+    describe the default tenant.
+
+    Args:
+        tenant_id: Traction tenant ID (optional, defaults to the default tenant)
+
+    Returns:
+        dict: api_key, wallet_id, base_url, timeout, token_ttl and credential_definition_id
+    """
+    tenant_id = tenant_id or get_default_tenant_id()
+    tenants = getattr(settings, "TRACTION_TENANTS", {})
+
+    config = {
+        "api_key": None,
+        "wallet_id": None,
+        "base_url": getattr(settings, "TRACTION_API_BASE_URL", ""),
+        "timeout": getattr(settings, "TRACTION_API_TIMEOUT", 30),
+        "token_ttl": getattr(settings, "TRACTION_TOKEN_TTL", 3000),
+        "credential_definition_id": getattr(
+            settings, "TRACTION_CREDENTIAL_DEFINITION_ID", None
+        ),
+    }
+    if tenant_id == getattr(settings, "TRACTION_TENANT_ID", None):
+        config["api_key"] = getattr(settings, "TRACTION_API_KEY", None)
+        config["wallet_id"] = getattr(settings, "TRACTION_WALLET_ID", None)
+    elif tenant_id not in tenants:
+        raise ValueError(f"Unknown Traction tenant: {tenant_id}")
+    config.update(tenants.get(tenant_id, {}))
+
+    if not config["base_url"]:
+        raise ValueError("TRACTION_API_BASE_URL is required in Django settings")
+
+    if not config["api_key"]:
+        raise ValueError(f"No Traction API key configured for tenant {tenant_id}")
+
+    return config
+
+
+def get_tenant_for_wallet(wallet_id):
+    """
+    Return the Traction tenant whose sub-wallet sent a webhook
+
+    ACA-Py identifies the sender of a webhook by its wallet ID (x-wallet-id),
+    which is not the Traction tenant ID: each tenant's wallet ID is configured
+    in TRACTION_WALLET_ID (default tenant) or its TRACTION_TENANTS "wallet_id".
+
+    Args:
+        wallet_id: Wallet ID sent with the webhook
+
+    Returns:
+        str: Traction tenant ID, or None if the wallet is not configured
+    """
+    if not wallet_id:
+        return None
+    if wallet_id == getattr(settings, "TRACTION_WALLET_ID", None):
+        return get_default_tenant_id()
+    for tenant_id, config in getattr(settings, "TRACTION_TENANTS", {}).items():
+        if config.get("wallet_id") == wallet_id:
+            return tenant_id
+    return None
+
+
+def get_tenant_for_department(department):
+    """
+    Return the Traction tenant serving a department
+
+    Args:
+        department: Student department ("" or None for none)
+
+    Returns:
+        str: The tenant listing the department in its "departments" entry, or
+        the default tenant
+    """
+    if department:
+        for tenant_id, config in getattr(settings, "TRACTION_TENANTS", {}).items():
+            if department in config.get("departments", ()):
+                return tenant_id
+
+    return get_default_tenant_id()
+
+
+def get_tenant_for_user(user):
+    """
+    Return the Traction tenant serving a user
+
+    A tenant listing the student's department in its "departments" entry is
+    chosen; users without a matching department use the default tenant.
+
+    Args:
+        user: Django user
+
+    Returns:
+        str: Traction tenant ID
+    """
+    department = None
+    if getattr(settings, "TRACTION_TENANTS", {}):
+        from .models import Student
+
+        department = (
+            Student.objects.filter(user=user)
+            .values_list("department", flat=True)
+            .first()
+        )
+
+    return get_tenant_for_department(department)
 
 
 class TractionDjangoClient:
-    """Django-specific wrapper for TractionAPI"""
+    """Django-specific registry of TractionAPI clients, one per tenant"""
 
-    _instance = None
+    # tenant_id -> [client, last_used], least recently used first
+    _clients = OrderedDict()
+    _lock = threading.Lock()
 
     @classmethod
-    def get_client(cls):
+    def get_client(cls, tenant_id=None):
         """
-        Get or create a singleton TractionAPI client instance
+        Get or lazily create the TractionAPI client of a tenant
+
+        At most TRACTION_CLIENT_REGISTRY_SIZE clients are kept; the least
+        recently used one is dropped when the registry is full, and clients
+        unused for TRACTION_CLIENT_IDLE_TIMEOUT seconds are dropped as well.
+        Evicted clients are not closed: a request in another thread may still
+        be using one, and its connection pool is closed when the last reference
+        goes away.
+
+        Args:
+            tenant_id: Traction tenant ID (optional, defaults to the default tenant)
 
         Returns:
             TractionAPI: Configured API client
         """
-        if cls._instance is None:
-            # Get settings from Django settings
-            api_key = getattr(settings, "TRACTION_API_KEY", None)
-            base_url = getattr(settings, "TRACTION_API_BASE_URL", "")
-            timeout = getattr(settings, "TRACTION_API_TIMEOUT", 30)
-            tenant_id = getattr(settings, "TRACTION_TENANT_ID", None)
-            if not tenant_id:
-                raise ValueError("TRACTION_TENANT_ID is required in Django settings")
-
-            if not base_url:
-                raise ValueError("TRACTION_API_BASE_URL is required in Django settings")
-
-            if not api_key:
-                raise ValueError("TRACTION_API_KEY is required in Django settings")
-
-            cls._instance = TractionAPI(
-                api_key=api_key, tenant_id=tenant_id, base_url=base_url, timeout=timeout
+        tenant_id = tenant_id or get_default_tenant_id()
+        now = time.monotonic()
+
+        with cls._lock:
+            cls._evict_idle(now)
+
+            entry = cls._clients.get(tenant_id)
+            if entry is not None:
+                entry[1] = now
+                cls._clients.move_to_end(tenant_id)
+                return entry[0]
+
+            # Imported on first use so that loading this module does not pull in requests
+            from .traction_api import TractionAPI
+
+            config = get_tenant_config(tenant_id)
+            client = TractionAPI(
+                api_key=config["api_key"],
+                tenant_id=tenant_id,
+                base_url=config["base_url"],
+                timeout=config["timeout"],
+                token_ttl=config["token_ttl"],
             )
+            # Close the pool once no thread holds the client any more
+            weakref.finalize(client, client.session.close)
+            cls._clients[tenant_id] = [client, now]
 
-        return cls._instance
+            max_size = getattr(settings, "TRACTION_CLIENT_REGISTRY_SIZE", 32)
+            while len(cls._clients) > max_size:
+                cls._clients.popitem(last=False)
+
+        return client
 
     @classmethod
-    def reset_client(cls):
-        """Reset the singleton instance (useful for testing)"""
-        cls._instance = None
+    def _evict_idle(cls, now):
+        idle_timeout = getattr(settings, "TRACTION_CLIENT_IDLE_TIMEOUT", 900)
+        while cls._clients:
+            tenant_id, (_, last_used) = next(iter(cls._clients.items()))
+            if now - last_used < idle_timeout:
+                break
+            del cls._clients[tenant_id]
 
+    @classmethod
+    def reset_client(cls, tenant_id=None):
+        """Close and forget one client, or all of them (useful for testing)"""
+        with cls._lock:
+            tenant_ids = [tenant_id] if tenant_id else list(cls._clients)
+            for key in tenant_ids:
+                entry = cls._clients.pop(key, None)
+                if entry is not None:
+                    entry[0].close()
 
-def get_traction_client():
+
+def get_traction_client(tenant_id=None):
     """
-    Helper function to get the TractionAPI client
+    Helper function to get the TractionAPI client of a tenant
+
+    Args:
+        tenant_id: Traction tenant ID (optional, defaults to the default tenant)
 
     Returns:
         TractionAPI: Configured API client
     """
-    return TractionDjangoClient.get_client()
+    return TractionDjangoClient.get_client(tenant_id)
 
 
 # Cache decorators for common operations
@@ -75,9 +246,11 @@ def cache_traction_data(func):
     )  # 5 minutes default
 
     def wrapper(*args, **kwargs):
-        # Create a cache key based on function name and arguments
+        # Create a cache key based on function name and arguments, hashed so
+        # that keys stay short and valid for every cache backend
+        arguments = f"{args!r}_{sorted(kwargs.items())!r}"
         cache_key = (
-            f"traction_{func.__name__}_{str(args)}_{str(sorted(kwargs.items()))}"
+            f"traction_{func.__name__}_{hashlib.sha256(arguments.encode()).hexdigest()}"
         )
         result = cache.get(cache_key)
 
@@ -0,0 +1,154 @@
+"""
+Minimal local stand-in for the Traction tenant API.
+
+It answers the endpoints used by this project with canned, well-formed
+records so the app can be exercised (replays, benchmarks, soak tests)
+without a Traction account. Start it with ``manage.py traction_stub``.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class TractionStubHandler(BaseHTTPRequestHandler):
+    """Request handler answering Traction endpoints with canned records"""
+
+    # Artificial latency (seconds) added to every response
+    latency = 0.0
+    # Number of records served by each list endpoint
+    list_size = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_POST(self):
+        body = self._read_body()
+        path = urlparse(self.path).path
+        if self.latency:
+            time.sleep(self.latency)
+
+        if re.fullmatch(r"/multitenancy/tenant/[^/]+/token", path):
+            return self._send_json({"token": "stub-token"})
+
+        if path == "/connections/create-invitation":
+            connection_id = str(uuid.uuid4())
+            return self._send_json(
+                {
+                    "connection_id": connection_id,
+                    "invitation": {
+                        "@type": "https://didcomm.org/connections/1.0/invitation",
+                        "@id": str(uuid.uuid4()),
+                        "label": "Traction stub",
+                        "recipientKeys": [uuid.uuid4().hex],
+                        "serviceEndpoint": "http://localhost/stub",
+                    },
+                    "invitation_url": f"http://localhost/stub?c_i={connection_id}",
+                }
+            )
+
+        if path == "/issue-credential/send-offer":
+            return self._send_json(
+                {
+                    "credential_exchange_id": str(uuid.uuid4()),
+                    "connection_id": body.get("connection_id"),
+                    "state": "offer_sent",
+                }
+            )
+
+        match = re.fullmatch(r"/issue-credential/records/([^/]+)/issue", path)
+        if match:
+            return self._send_json(
+                {"credential_exchange_id": match.group(1), "state": "credential_issued"}
+            )
+
+        if path == "/present-proof/send-request":
+            return self._send_json(
+                {
+                    "presentation_exchange_id": str(uuid.uuid4()),
+                    "connection_id": body.get("connection_id"),
+                    "state": "request_sent",
+                }
+            )
+
+        return self._send_json({})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if self.latency:
+            time.sleep(self.latency)
+
+        match = re.fullmatch(r"/connections/([^/]+)", url.path)
+        if match:
+            return self._send_json({"connection_id": match.group(1), "state": "active"})
+
+        if url.path in (
+            "/connections",
+            "/issue-credential/records",
+            "/present-proof/records",
+        ):
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", [str(self.list_size)])[0])
+            state = query.get("state", ["active"])[0]
+            results = [
+                {"record_id": f"{url.path}/{index}", "state": state}
+                for index in range(offset, min(offset + limit, self.list_size))
+            ]
+            return self._send_json({"results": results})
+
+        if url.path == "/status":
+            return self._send_json({"status": "ok"})
+
+        return self._send_json({}, status=404)
+
+
+def start_traction_stub(host="127.0.0.1", port=0, latency=0.0, list_size=0):
+    """
+    Start the stub server in a daemon thread
+
+    Args:
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        latency: Artificial latency in seconds added to every response
+        list_size: Number of records served by each list endpoint
+
+    Returns:
+        ThreadingHTTPServer: Running server; call shutdown() to stop it
+    """
+    handler = type(
+        "TractionStub",
+        (TractionStubHandler,),
+        {"latency": latency, "list_size": list_size},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_stub_url(server):
+    """Return the base URL of a running stub server"""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
@@ -1,6 +1,7 @@
 from django.urls import path
 
 from . import views
+from .webhook_urls import urlpatterns as webhook_urlpatterns
 
 # https://docs.djangoproject.com/en/3.2/topics/http/urls/
 app_name = "student"
@@ -14,17 +15,8 @@ urlpatterns = [
     path(
         "presentation_request/", views.presentation_request, name="presentation-request"
     ),
+    path("ratelimit/stats/", views.ratelimit_stats, name="ratelimit-stats"),
+    path("profiling/hotspots/", views.profile_hotspots, name="profile-hotspots"),
     # Webhook endpoints
-    path("topic/connections/", views.webhook_connections, name="webhook_connections"),
-    path(
-        "topic/issue_credential/",
-        views.webhook_issue_credential,
-        name="webhook_issue_credential",
-    ),
-    path(
-        "topic/present_proof/",
-        views.webhook_present_proof,
-        name="webhook_present_proof",
-    ),
-    path("topic/ping/", views.webhook_ping, name="webhook_ping"),
+    *webhook_urlpatterns,
 ]
@@ -1,6 +1,5 @@
 import base64
 import io
-import qrcode
 
 
 def generate_qrcode(
@@ -18,6 +17,8 @@ def generate_qrcode(
     Returns:
         str: Base64 encoded string of the QR code image.
     """
+    # Imported on first use: qrcode pulls in PIL, which most workers never need
+    import qrcode
 
     qr = qrcode.QRCode(
         version=version,
@@ -31,11 +32,13 @@ def generate_qrcode(
     # Create an image from the QR code
     img = qr.make_image(fill_color=fill_color, back_color=back_color)
 
-    # Save the image to a bytes buffer
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+    # Save the image to a bytes buffer, releasing the image and buffer right away
+    with io.BytesIO() as buffer:
+        try:
+            img.save(buffer, format="PNG")
+        finally:
+            img.get_image().close()
 
-    # Convert the image to a base64 string to display in HTML
-    img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        # Convert the image to a base64 string to display in HTML
+        img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
     return img_base64
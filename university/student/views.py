@@ -1,20 +1,30 @@
 import json
 from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 
-from student.traction_django import get_traction_client
+from student.traction_django import get_tenant_config, get_tenant_for_user, get_traction_client
 
 from .models import ConnectionState
+from .profiling import format_collapsed, format_hotspots, profile_store
+from .ratelimit import allow_request, get_counters
+from .services import (
+    get_active_connection,
+    get_flow_for_token,
+    get_pending_invitation,
+    get_recent_verification,
+    invalidate_active_connection,
+    make_flow_token,
+    send_credential_offer,
+    send_proof_request,
+    set_pending_invitation,
+    snapshot_credential_attributes,
+)
 from .forms import UserRegistrationForm
 from .util import generate_qrcode
-from django.conf import settings
-import requests
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse
 import logging
 from .EnumState import StateModelEnum
-import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -30,12 +40,44 @@ def home(request):
 def issue_credential(request):
     context = {}
 
+    # Students already connected to us get the offer over the existing connection
+    state_model = get_active_connection(request.user)
+    if state_model is not None:
+        try:
+            if state_model.state != StateModelEnum.OFFER_SENT.value:
+                if not allow_request("send-offer", request.user):
+                    return render(
+                        request, "student/credential.html", {"rate_limited": True}
+                    )
+                # A new offer on a reused connection: refresh the attribute snapshot
+                state_model = send_credential_offer(state_model, user=request.user)
+            return render(
+                request,
+                "student/credential.html",
+                {
+                    "connection_id": state_model.connection_id,
+                    "offer_sent": True,
+                    "flow_token": make_flow_token(state_model),
+                },
+            )
+        except Exception as err:
+            # The connection may be gone on the wallet side: fall back to a new invitation
+            logger.error(err)
+            invalidate_active_connection(request.user.pk)
+
+    # Shed load: serve the pending invitation instead of creating another one
+    if not allow_request("create-invitation", request.user):
+        context = get_pending_invitation(request.user.pk) or {"rate_limited": True}
+        return render(request, "student/credential.html", context)
+
     invitation = ""
     connection_id = ""
     invitation_url = ""
+    tenant_id = ""
 
     try:
-        _client = get_traction_client()
+        tenant_id = get_tenant_for_user(request.user)
+        _client = get_traction_client(tenant_id)
         invitation_data = _client.send_traction_request(
             endpoint="/connections/create-invitation"
         )
@@ -47,17 +89,12 @@ def issue_credential(request):
         invitation_url = invitation_data.get("invitation_url")
         logger.info(connection_id)
 
-    except requests.exceptions.HTTPError as err:
-        logger.error(err)
     except Exception as err:
         logger.error(err)
 
     if not invitation:
         return render(request, "student/credential.html", {"is_expired": True})
 
-    # Store the connection_id in the session for later use
-    request.session["connection_id"] = connection_id
-
     # Format based on what's available
     if invitation_url:
         # If we have a URL, use it directly
@@ -75,22 +112,26 @@ def issue_credential(request):
         back_color="white",
     )
 
-    ConnectionState.objects.create(
+    state_model = ConnectionState.objects.create(
         connection_id=connection_id,
         revocation_registry_id="",
         revocation_id="",
         presentation_exchange_id="",
         state=StateModelEnum.CONNECTION_INVITATION.value,
+        tenant_id=tenant_id,
+        credential_attributes=snapshot_credential_attributes(request.user),
         user=request.user,
     )
 
-    # Response context
+    # Response context; the flow travels in the page as a signed token, not in the session
     context = {
         "connection_id": connection_id,
+        "flow_token": make_flow_token(state_model),
         "qr_code_img": f"data:image/png;base64,{img_base64}",
         "invitation_url": invitation_url,
         "invitation_json": json.dumps(invitation, indent=4),
     }
+    set_pending_invitation(request.user.pk, context)
 
     return render(request, "student/credential.html", context)
 
@@ -116,212 +157,61 @@ def presentation_request(request):
 
     # Check if the user has an existing connection state
     if request.method == "POST":
-        state_model = ConnectionState.objects.filter(user=request.user).last()
-
-        if state_model:
-            logger.info(f"Using existing state model: {state_model}")
-            body = {
-                "connection_id": state_model.connection_id,
-                "auto_verify": False,
-                "trace": False,
-                "proof_request": {
-                    "name": "proof-request",
-                    "nonce": "1234567890",
-                    "version": "1.0",
-                    "requested_attributes": {
-                        "demo_attributes": {
-                            "names": ["given_name", "family_name"],
-                            "restrictions": [
-                                {
-                                    "cred_def_id": settings.TRACTION_CREDENTIAL_DEFINITION_ID
-                                }
-                            ],
-                        }
-                    },
-                    "requested_predicates": {
-                        "not_expired": {
-                            "name": "expires",
-                            "p_type": ">=",
-                            "p_value": datetime.date.today()
-                            .isoformat()
-                            .replace(
-                                "-", ""
-                            ),  # Number.parseInt(new Date().toISOString().substring(0, 10).replace(/-/g, '')),
-                            "restrictions": [
-                                {
-                                    "cred_def_id": settings.TRACTION_CREDENTIAL_DEFINITION_ID
-                                }
-                            ],
-                        }
-                    },
-                },
-            }
-
-            _client = get_traction_client()
-            send_request_data = _client.send_traction_request(
-                endpoint="/present-proof/send-request", body=body
+        # A recent verification answers the check without contacting the wallet
+        cred_def_id = get_tenant_config(get_tenant_for_user(request.user))[
+            "credential_definition_id"
+        ]
+        verification = get_recent_verification(request.user, cred_def_id)
+        state_model = None
+        if verification is not None:
+            context = {"show_request": False, "verification": verification}
+        else:
+            # The flow of the page the form came from, else the user's latest one
+            state_model = (
+                get_flow_for_token(request.POST.get("flow_token"), request.user)
+                or get_active_connection(request.user)
+                or ConnectionState.objects.filter(user=request.user).last()
             )
-            logger.info(send_request_data)
 
-            state_model.presentation_exchange_id = send_request_data.get(
-                "presentation_exchange_id"
-            )
-            state_model.save()
+        if state_model and not allow_request("send-request", request.user):
+            context = {"show_request": True, "rate_limited": True}
+        elif state_model:
+            logger.info(f"Using existing state model: {state_model.pk}")
+            send_proof_request(state_model)
             context = {"show_request": False}
     else:
-        context = {"show_request": True}
+        context = {"show_request": True, "flow_token": request.GET.get("flow", "")}
 
     return render(request, "student/request-credential.html", context)
 
 
-## Webhook endpoints ##
-@csrf_exempt
-@require_http_methods(["POST"])
-def webhook_connections(request):
-    """Handle connection webhook"""
-    # Check authorization
-    if request.headers.get("x-api-key") != "demo-issuance":
-        return HttpResponse(status=401)
-
-    body = json.loads(request.body)
-
-    logger.info(body.get("connection_id"))
-    logger.info(body.get("state"))
-    state_model = ConnectionState.objects.filter(
-        connection_id=body.get("connection_id")
-    ).first()
-
-    # Unless the connection is made (state = active) and we're in the correct state, we just wait
-    if body.get("state") != "active" or state_model.state != "CONNECTION INVITATION":
-        return HttpResponse(status=200)
-
-    # # Now that the connection is made, offer the credential
-    logger.info("Sending credential offer.")
-
-    # Create a credential offer
-    _client = get_traction_client()
-    _client.send_traction_request(
-        endpoint="/issue-credential/send-offer",
-        body={
-            "auto_issue": settings.CREDENTIAL_AUTO_ISSUE,
-            "auto_remove": False,
-            "connection_id": body.get("connection_id"),
-            "cred_def_id": settings.TRACTION_CREDENTIAL_DEFINITION_ID,
-            "trace": False,
-            "credential_preview": {
-                "@type": "issue-credential/1.0/credential-preview",
-                "attributes": [
-                    {
-                        "name": "given_name",
-                        "value": state_model.user.first_name,
-                    },
-                    {
-                        "name": "family_name",
-                        "value": state_model.user.last_name,
-                    },
-                    {
-                        "name": "expires",
-                        "value": settings.CREDENTIAL_DATA.get("expires"),
-                    },
-                ],
-            },
-        },
-    )
-
-    state_model.state = StateModelEnum.OFFER_SENT.value
-    state_model.save()
-
-    return HttpResponse(status=200)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def webhook_issue_credential(request):
-    """Handle issue credential webhook"""
-    # Check authorization
-    if request.headers.get("x-api-key") != "demo-issuance":
-        return HttpResponse(status=401)
-
-    body = json.loads(request.body)
-
-    state_model = ConnectionState.objects.filter(
-        connection_id=body.get("connection_id")
-    ).first()
-
-    # If state = abandoned then user declined
-    if (
-        body.get("state") == "abandoned"
-        and state_model.state == StateModelEnum.OFFER_SENT.value
-    ):
-        logger.info("User declined offer.")
-
-    # If state = credential_acked or credential_issued then user received the credential in their wallet
-    if body.get("state") in [
-        "credential_acked",
-        "credential_issued",
-    ] and state_model.state in [
-        StateModelEnum.OFFER_SENT.value,
-        StateModelEnum.CREDENTIAL_ISSUED.value,
-    ]:
-        state_model.revocation_registry_id = body.get("revocation_registry_id") or ""
-        state_model.revocation_id = body.get("revocation_id") or ""
-        state_model.save()
-        logger.info("Issuance complete.")
-
-    # If state = request_received then we received the credential request
-    if (
-        body.get("state") == "request_received"
-        and state_model.state == StateModelEnum.OFFER_SENT.value
-    ):
-        # If we're not auto-issuing the credential then we must manually issue
-        if not body.get("auto_issue"):
-            logger.info("Issuing credential.")
-            # Create a credential offer
-            _client = get_traction_client()
-            # send_traction_request(
-            _client.send_traction_request(
-                f"/issue-credential/records/{body.get('credential_exchange_id')}/issue"
-            )
-        state_model.state = StateModelEnum.CREDENTIAL_ISSUED.value
-        state_model.save()
-    return HttpResponse(status=200)
-
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def webhook_present_proof(request):
-    """Handle present proof webhook"""
-    body = json.loads(request.body)
-
-    state_model = ConnectionState.objects.filter(
-        connection_id=body.get("connection_id")
-    ).first()
+@staff_member_required
+def ratelimit_stats(request):
+    """Allowed and shed request counters of the Traction rate limits"""
+    return JsonResponse(get_counters())
 
-    if (
-        state_model is None
-        or state_model.presentation_exchange_id is None
-        or state_model.presentation_exchange_id != body.get("presentation_exchange_id")
-    ):
-        return HttpResponse(status=200)
 
-    if body.get("state") == "verified":
-        logger.info("User presented successfully.")
-        state_model.presentation_exchange_id = ""
-        state_model.save()
-    elif body.get("state") == "abandoned":
-        logger.info("User declined presentation.")
-        state_model.presentation_exchange_id = ""
-        state_model.save()
+@staff_member_required
+def profile_hotspots(request):
+    """
+    Dump the sampled request profiles of the rolling window
 
-    return HttpResponse(status=200)
+    Query parameters: view (view name filter), format ("top" or "collapsed",
+    the flame graph input format) and limit (frames per view for "top").
 
-
-@csrf_exempt
-@require_http_methods(["POST"])
-def webhook_ping(request):
-    """Handle ping webhook"""
-    body = json.loads(request.body)
-
-    logger.info(body)
-
-    return HttpResponse(status=200)
+    Profiles are kept in memory by each worker process: the dump only covers
+    the requests sampled by the worker that serves it.
+    """
+    try:
+        limit = int(request.GET.get("limit", 20))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return HttpResponseBadRequest("limit must be a positive integer")
+
+    aggregated = profile_store.collapsed(request.GET.get("view") or None)
+    if request.GET.get("format") == "collapsed":
+        content = format_collapsed(aggregated)
+    else:
+        content = format_hotspots(aggregated, limit)
+    return HttpResponse(content, content_type="text/plain; charset=utf-8")
@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import webhook_views
+
+# Served by WebhookWSGIHandler without middleware; also included in student.urls
+urlpatterns = [
+    path("topic/connections/", webhook_views.webhook_connections, name="webhook_connections"),
+    path(
+        "topic/issue_credential/",
+        webhook_views.webhook_issue_credential,
+        name="webhook_issue_credential",
+    ),
+    path(
+        "topic/present_proof/",
+        webhook_views.webhook_present_proof,
+        name="webhook_present_proof",
+    ),
+    path("topic/ping/", webhook_views.webhook_ping, name="webhook_ping"),
+]
@@ -0,0 +1,55 @@
+"""
+Traction webhook views.
+
+Kept apart from student.views so webhook-only workers do not import the
+page views and their QR code stack.
+"""
+
+import json
+
+from django.http import HttpResponse
+
+from .event_log import record_event
+from .services import WEBHOOK_HANDLERS
+from .webhooks import require_webhook_auth
+
+
+def _handle_webhook(request, topic):
+    """Log a webhook event and apply it through its topic handler"""
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+    if not isinstance(body, dict):
+        return HttpResponse(status=400)
+    # ACA-Py identifies the sub-wallet (Traction tenant) of a webhook in x-wallet-id
+    wallet_id = request.headers.get("x-wallet-id")
+
+    record_event(topic, body, wallet_id)
+    WEBHOOK_HANDLERS[topic](body, wallet_id)
+
+    return HttpResponse(status=200)
+
+
+@require_webhook_auth
+def webhook_connections(request):
+    """Handle connection webhook"""
+    return _handle_webhook(request, "connections")
+
+
+@require_webhook_auth
+def webhook_issue_credential(request):
+    """Handle issue credential webhook"""
+    return _handle_webhook(request, "issue_credential")
+
+
+@require_webhook_auth
+def webhook_present_proof(request):
+    """Handle present proof webhook"""
+    return _handle_webhook(request, "present_proof")
+
+
+@require_webhook_auth
+def webhook_ping(request):
+    """Handle ping webhook"""
+    return _handle_webhook(request, "ping")
@@ -0,0 +1,117 @@
+"""
+Lean request handling for the Traction webhook endpoints.
+
+Webhooks are server-to-server POSTs: they never carry a session, a logged-in
+user or flash messages, so they are served by a WSGI handler with no
+middleware besides the opt-in sampling profiler, and routed through their
+own URLconf.
+"""
+
+import hashlib
+import hmac
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .profiling import SamplingProfilerMiddleware
+
+
+def require_webhook_auth(view):
+    """
+    Decorator to authenticate Traction webhook requests
+
+    The API key (and the body size) are checked before the body is read; the
+    optional HMAC signature of the body is checked last. All comparisons are
+    constant-time.
+
+    Args:
+        view: Webhook view to decorate
+
+    Returns:
+        Wrapped view that rejects unauthenticated requests
+    """
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "POST":
+            return HttpResponse(status=405, headers={"Allow": "POST"})
+
+        api_key = getattr(settings, "WEBHOOK_API_KEY", "")
+        provided_key = request.headers.get("x-api-key", "")
+        if not api_key or not hmac.compare_digest(
+            provided_key.encode(), api_key.encode()
+        ):
+            return HttpResponse(status=401)
+
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return HttpResponse(status=400)
+        if content_length > getattr(settings, "WEBHOOK_MAX_BODY_SIZE", 1024 * 1024):
+            return HttpResponse(status=413)
+
+        hmac_secret = getattr(settings, "WEBHOOK_HMAC_SECRET", "")
+        if hmac_secret:
+            signature = request.headers.get("x-signature", "")
+            digest = hmac.new(
+                hmac_secret.encode(), request.body, hashlib.sha256
+            ).hexdigest()
+            if not hmac.compare_digest(signature.encode(), digest.encode()):
+                return HttpResponse(status=401)
+
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class WebhookWSGIHandler(WSGIHandler):
+    """
+    WSGI handler that serves the webhook URLconf without the middleware stack
+
+    Only the sampling profiler wraps the view, when it is configured, so
+    webhook requests are profiled like the pages.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        if not is_async:
+            try:
+                handler = convert_exception_to_response(SamplingProfilerMiddleware(handler))
+            except MiddlewareNotUsed:
+                pass
+        self._middleware_chain = handler
+
+    def get_response(self, request):
+        request.urlconf = getattr(
+            settings, "WEBHOOK_URLCONF", "student.webhook_urls"
+        )
+        return super().get_response(request)
+
+
+class WebhookDispatcher:
+    """
+    WSGI application that sends webhook paths to the lean handler
+
+    Every other path goes to the regular Django application.
+    """
+
+    def __init__(self, application, webhook_application=None):
+        self.application = application
+        self.webhook_application = webhook_application or WebhookWSGIHandler()
+        self.prefix = getattr(settings, "WEBHOOK_URL_PREFIX", "/topic/")
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(self.prefix):
+            return self.webhook_application(environ, start_response)
+        return self.application(environ, start_response)
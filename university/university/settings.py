@@ -10,25 +10,44 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
 import os
+import secrets
 from pathlib import Path
-from dotenv import load_dotenv
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-load_dotenv(f"{BASE_DIR}/.env")
+# python-dotenv is only imported when there is a .env file to load
+if os.path.exists(f"{BASE_DIR}/.env"):
+    from dotenv import load_dotenv
+
+    load_dotenv(f"{BASE_DIR}/.env")
 
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-aqnbqj$8gzwt^3_%tg9@x*ff3v5%cnb3xmmvct$kmlyigh64)p"
-
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# SECURITY WARNING: keep the secret key used in production secret!
+# It signs the session cookies and the flow tokens, so it must never be
+# committed. Without DJANGO_SECRET_KEY each process draws a random key: fine
+# for a single development process, but sessions and flow tokens then do not
+# survive a restart or work across several workers.
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "")
+# Placeholders once shipped in sample.env: anyone can forge sessions with them
+SECRET_KEY_PLACEHOLDERS = {"GERAR-UMA-CHAVE"}
+if SECRET_KEY in SECRET_KEY_PLACEHOLDERS:
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY is still the sample.env placeholder")
+if not SECRET_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("DJANGO_SECRET_KEY is required when DEBUG is off")
+    SECRET_KEY = secrets.token_urlsafe(50)
+
 ALLOWED_HOSTS = ["*"]
 
 
@@ -46,6 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "student.profiling.SamplingProfilerMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -121,6 +141,29 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rate limits and per-user lookups are only shared between workers when the
+# cache is, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/#configuring-the-session-engine
+# Signed cookies need no database or cache access per request. With a shared
+# cache, "django.contrib.sessions.backends.cache" (or "cached_db") also works.
+
+SESSION_ENGINE = os.getenv(
+    "SESSION_ENGINE", "django.contrib.sessions.backends.signed_cookies"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -141,10 +184,82 @@ LOGIN_URL = "login"
 ### ACAPY settings ###
 TRACTION_TENANT_ID = os.getenv("TRACTION_TENANT_ID")
 TRACTION_API_KEY = os.getenv("TRACTION_API_KEY")
+# Sub-wallet of the tenant, sent by ACA-Py in the x-wallet-id header of its webhooks
+TRACTION_WALLET_ID = os.getenv("TRACTION_WALLET_ID")
 TRACTION_CREDENTIAL_DEFINITION_ID = os.getenv("TRACTION_CREDENTIAL_DEFINITION_ID")
-CREDENTIAL_AUTO_ISSUE = eval(os.getenv("CREDENTIAL_AUTO_ISSUE", "False"))
+CREDENTIAL_AUTO_ISSUE = os.getenv("CREDENTIAL_AUTO_ISSUE", "False").strip().lower() in (
+    "true",
+    "1",
+    "yes",
+)
 CREDENTIAL_DATA = {"givenName": "John", "familyName": "Doe", "expires": "20231231"}
+# Attributes of the credential schema, offered from the snapshot taken at invitation time
+CREDENTIAL_ATTRIBUTES = ["given_name", "family_name", "expires"]
+# Days the credential is valid from the invitation; 0 uses CREDENTIAL_DATA["expires"]
+CREDENTIAL_VALIDITY_DAYS = int(os.getenv("CREDENTIAL_VALIDITY_DAYS") or 0)
 TRACTION_API_BASE_URL = os.getenv(
     "TRACTION_API_BASE_URL",
     "https://traction-sandbox-tenant-proxy.apps.silver.devops.gov.bc.ca",
 )
+# Additional tenants, as a JSON object keyed by tenant ID, e.g.
+# {"<tenant_id>": {"api_key": "...", "wallet_id": "...", "credential_definition_id": "...",
+#                  "departments": ["..."]}}
+# Students whose department is listed are served by that tenant.
+TRACTION_TENANTS = json.loads(os.getenv("TRACTION_TENANTS", "{}"))
+TRACTION_CLIENT_REGISTRY_SIZE = int(os.getenv("TRACTION_CLIENT_REGISTRY_SIZE", 32))
+TRACTION_CLIENT_IDLE_TIMEOUT = int(os.getenv("TRACTION_CLIENT_IDLE_TIMEOUT", 900))
+TRACTION_TOKEN_TTL = int(os.getenv("TRACTION_TOKEN_TTL", 3000))
+# Seconds a user's active DIDComm connection lookup is cached
+ACTIVE_CONNECTION_CACHE_TIMEOUT = 300
+# Seconds a pending invitation page is kept to be served to rate-limited users
+PENDING_INVITATION_CACHE_TIMEOUT = 3600
+# Seconds a signed flow token carried in a page stays valid
+FLOW_TOKEN_MAX_AGE = 3600
+# Seconds a verified presentation is reused instead of requesting a new proof (0 disables)
+VERIFICATION_MAX_AGE = int(os.getenv("VERIFICATION_MAX_AGE", 3600))
+# Seconds a user's latest verified presentation lookup is cached
+VERIFICATION_CACHE_TIMEOUT = 300
+# Token buckets per Traction endpoint: "burst" requests at once, refilled at
+# "refill" requests per second, for each user and for the whole deployment
+TRACTION_RATE_LIMITS = {
+    "create-invitation": {
+        "user": {"burst": 3, "refill": 1 / 60},
+        "global": {"burst": 60, "refill": 5},
+    },
+    "send-offer": {
+        "user": {"burst": 3, "refill": 1 / 60},
+        "global": {"burst": 60, "refill": 5},
+    },
+    "send-request": {
+        "user": {"burst": 5, "refill": 1 / 30},
+        "global": {"burst": 60, "refill": 5},
+    },
+}
+
+### Profiling ###
+# Requests are profiled with probability PROFILER_SAMPLE_RATE, when they carry
+# "X-Profile: <PROFILER_TOKEN>", or when their path matches a PROFILER_PATHS
+# regex. Results: /profiling/hotspots/ (staff only).
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", 0))
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_PATHS = [p for p in os.getenv("PROFILER_PATHS", "").split(",") if p]
+PROFILER_INTERVAL = 0.005
+PROFILER_WINDOW = 600
+PROFILER_MAX_PROFILES = 1000
+
+### Webhook settings ###
+# Requests under this prefix are served by student.webhooks.WebhookWSGIHandler
+WEBHOOK_URL_PREFIX = "/topic/"
+WEBHOOK_URLCONF = "student.webhook_urls"
+# Required: webhooks are rejected while no key is configured
+WEBHOOK_API_KEY = os.getenv("WEBHOOK_API_KEY", "")
+# Optional: when set, webhooks must carry a hex HMAC-SHA256 of the body in X-Signature
+WEBHOOK_HMAC_SECRET = os.getenv("WEBHOOK_HMAC_SECRET", "")
+WEBHOOK_MAX_BODY_SIZE = int(os.getenv("WEBHOOK_MAX_BODY_SIZE", 1024 * 1024))
+# Append-only log of incoming webhook events, replayed by `manage.py replay_events`
+# (empty to disable). Rotated files are gzip-compressed.
+WEBHOOK_EVENT_LOG = os.getenv(
+    "WEBHOOK_EVENT_LOG", os.path.join(BASE_DIR, "logs", "webhook-events.log")
+)
+WEBHOOK_EVENT_LOG_MAX_BYTES = int(os.getenv("WEBHOOK_EVENT_LOG_MAX_BYTES", 50 * 1024 * 1024))
+WEBHOOK_EVENT_LOG_BACKUP_COUNT = int(os.getenv("WEBHOOK_EVENT_LOG_BACKUP_COUNT", 20))
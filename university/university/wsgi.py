@@ -13,4 +13,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'university.settings')
 
-application = get_wsgi_application()
+django_application = get_wsgi_application()
+
+# Webhook endpoints bypass the middleware stack (see student/webhooks.py)
+from student.webhooks import WebhookDispatcher  # noqa: E402
+
+application = WebhookDispatcher(django_application)